@@ -112,6 +112,31 @@ export class ModelLedgerContract extends Contract {
         return modelJSON && modelJSON.length > 0;
     }
 
+    // ModelsExist returns, for a JSON array of IDs, a JSON array of whether each model exists in world state.
+    @Transaction(false)
+    @Returns("string")
+    public async ModelsExist(ctx: Context, ids: string): Promise<string> {
+        const exists: boolean[] = [];
+        for (const id of JSON.parse(ids) as string[]) {
+            exists.push(await this.ModelExists(ctx, id));
+        }
+        return JSON.stringify(exists);
+    }
+
+    // ReadModels returns, for a JSON array of IDs, a JSON array of the stored models (null if a model does not exist).
+    @Transaction(false)
+    @Returns("string")
+    public async ReadModels(ctx: Context, ids: string): Promise<string> {
+        const models = [];
+        for (const id of JSON.parse(ids) as string[]) {
+            const modelJSON = await ctx.stub.getState(id);
+            models.push(
+                modelJSON && modelJSON.length > 0 ? JSON.parse(modelJSON.toString()) : null
+            );
+        }
+        return JSON.stringify(models);
+    }
+
     // GetAllModels returns all models found in the world state.
     @Transaction(false)
     @Returns("string")
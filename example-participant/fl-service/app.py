@@ -1,27 +1,33 @@
+import io
 import os
 import re
 import json
 import time
 import base64
+import traceback
 import warnings
+import threading
+from typing import TYPE_CHECKING
 
-import requests
-import flwr as fl
 from flask import Flask
-from flask import request, abort
-from flwr.common.typing import EvaluateIns
-from flwr.client.numpy_client import NumPyClientWrapper
-
-from src.client import client_pipeline
-from src.models.utils import (
-    client_model_info,
-    deserialize_model,
-    model_info,
-    ModelCheckpointInfo,
+from flask import request, abort, send_file
+
+from src.utils.admission import AdmissionQueue, Overloaded
+from src.utils.constants import (
+    ENDORSE_RETRY_AFTER,
+    JOB_POLL_INTERVAL,
+    SERVE_BACKLOG,
+    SERVE_CONNECTION_LIMIT,
+    SERVE_THREADS,
 )
-from src.utils.endorsement import endorse_model
+from src.utils.jobs import Job, JobRunner
+from src.utils.profiling import profiler
 from src.fabric.chaincode import invoke_chaincode
 
+# flwr, torch and opacus are slow to import, they are loaded by `warm_up`
+if TYPE_CHECKING:
+    from src.models.utils import ModelCheckpointInfo, ModelEntry
+
 PORT = int(os.environ.get("PORT", 3000))
 CLIENT_PORT = int(os.environ.get("CLIENT_PORT", PORT)) + 2000
 SERVER_PORT = int(os.environ.get("SERVER_PORT", 8080))
@@ -32,19 +38,104 @@ CHAINCODE_CREATE_MODEL_FN = os.environ.get("CHAINCODE_CREATE_MODEL_FN", "CreateM
 TEST_SIMULATE_ENDORSE = os.environ.get("TEST_SIMULATE_ENDORSE", False) == True
 TEST_SIMULATE_CLIENT_ID = int(os.environ.get("TEST_SIMULATE_CLIENT_ID", 0))
 TEST_SIMULATE_CLIENTS_COUNT = int(os.environ.get("TEST_SIMULATE_CLIENTS_COUNT", 0))
+ENDORSE_SEQUENTIAL = os.environ.get("ENDORSE_SEQUENTIAL", "False") == "True"
+CLIENT_FAST_START = os.environ.get("CLIENT_FAST_START", "True") == "True"
+CLIENT_WSGI_SERVER = os.environ.get("CLIENT_WSGI_SERVER", "flask")
 app = Flask(__name__)
 
+warmed = threading.Event()
+warm_error = None
+
+
+def warm_up():
+    """Import the training stack, then load the datasets and model."""
+    global wclient, endorsement, start_client, warm_error
+    start = time.perf_counter()
+    try:
+        with profiler.span("warm_up"):
+            import flwr as fl
+            from src.client import StoreClientWrapper, client_pipeline
+            from src.utils.endorsement import EndorsementPipeline
+
+            client = client_pipeline(
+                client_id=TEST_SIMULATE_CLIENT_ID,
+                num_clients=TEST_SIMULATE_CLIENTS_COUNT,
+            )
+            wclient = StoreClientWrapper(client)
+            endorsement = EndorsementPipeline(wclient, sequential=ENDORSE_SEQUENTIAL)
+            start_client = lambda server_address: fl.client.start_client(
+                server_address, client=wclient
+            )
+    except Exception as e:
+        warm_error = repr(e)
+        traceback.print_exc()
+        # Exit so the supervisor restarts the worker instead of probing it forever
+        os._exit(1)
+
+    warmed.set()
+    print(f"Warmed up in {time.perf_counter() - start:.2f}s")
+
+
+@app.before_request
+def require_warm():
+    # Only liveness and health answer until the client is loaded
+    if not warmed.is_set() and request.endpoint not in ("index", "health"):
+        return {"status": "warming"}, 503, {"Retry-After": "1"}
+
 
 @app.route("/")
 def index():
     return "Hello World!"
 
 
+@app.route("/health")
+def health():
+    if not warmed.is_set():
+        status = "failed" if warm_error else "warming"
+        return {"status": status, "error": warm_error}, 503
+
+    numpy_client = wclient.numpy_client
+    model_ready = numpy_client.committed_info.model_hash is not None
+    health = {
+        "status": "ok" if model_ready else "starting",
+        "dataset_loaded": {
+            "train": len(numpy_client.trainloader.dataset),
+            "test": len(numpy_client.testloader.dataset),
+        },
+        "model_ready": model_ready,
+        "locked": numpy_client.busy(),
+        "connected": bool(connection and connection.is_alive()),
+        "jobs": sum(not job.done for job in jobs.jobs()),
+    }
+
+    return health, 200 if model_ready else 503
+
+
+def connect(server_address: str) -> threading.Thread:
+    """Keep a single connection to the shard server, reused across rounds."""
+    global connection, connection_address
+    if connection and connection.is_alive():
+        if connection_address == server_address:
+            return connection
+        # A per-round server disconnects its clients once the round is over
+        connection.join()
+
+    connection_address = server_address
+    connection = threading.Thread(
+        target=start_client, args=(server_address,), name="flower", daemon=True
+    )
+    connection.start()
+
+    return connection
+
+
 @app.route("/round/start")
 def start_fl():
     round = request.args.get("round")
+    server_port = request.args.get("server_port", SERVER_PORT)
+    host_url = request.host_url
 
-    def post_model(checkpoint_info: ModelCheckpointInfo):
+    def post_model(checkpoint_info: "ModelCheckpointInfo"):
         # push weights learned locally
         invoke_chaincode(
             FABRIC_CHANNEL,
@@ -54,36 +145,97 @@ def start_fl():
                 f"model_{checkpoint_info.model_hash}",
                 checkpoint_info.model_hash,
                 PORT,
-                request.host_url,
+                host_url,
                 round,
                 checkpoint_info.last_acc,
             ],
             port=CLIENT_PORT,
         )
 
-    # Start a round of FL
-    wclient.numpy_client.post_model = post_model
-    start_client(f"localhost:{SERVER_PORT}")
+    def run_round(job: Job):
+        from src.models.utils import client_model_info
 
-    return client_model_info(wclient)
+        wclient.numpy_client.post_model = post_model
+        wclient.numpy_client.on_progress = job.report
+        fitted = threading.Event()
+        wclient.numpy_client.on_fit_end = fitted.set
+
+        # The shard server drives the round, wait for this client's fit
+        flower = connect(f"localhost:{server_port}")
+        while not fitted.wait(JOB_POLL_INTERVAL):
+            if not flower.is_alive():
+                raise ConnectionError("Disconnected before the round was fit")
+
+        return client_model_info(wclient)
+
+    # Start a round of FL in the background, progress is polled by job id
+    job = jobs.submit(run_round, name=f"round {round}")
+
+    return job.to_dict(), 202, {"Location": f"/round/jobs/{job.job_id}"}
+
+
+@app.route("/round/jobs")
+def round_jobs():
+    return {"jobs": [job.to_dict() for job in jobs.jobs()]}
+
+
+@app.route("/round/jobs/<job_id>")
+def round_job(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        abort(404)
+
+    return job.to_dict()
+
+
+@app.route("/round/jobs/<job_id>/progress")
+def round_job_progress(job_id):
+    job = jobs.get(job_id)
+    if not job:
+        abort(404)
+
+    return {"job_id": job.job_id, "status": job.status, "progress": job.progress}
+
+
+def send_model(entry: "ModelEntry"):
+    # Serve the cached protobuf bytes directly, with range and conditional support
+    response = send_file(
+        io.BytesIO(entry.serialized_model),
+        mimetype="application/octet-stream",
+        etag=entry.model_hash,
+        conditional=True,
+        max_age=0,
+    )
+    response.headers["X-Model-Hash"] = entry.model_hash
+
+    return response
 
 
 @app.route("/model")
 def model():
-    info = client_model_info(wclient)
+    return send_model(wclient.numpy_client.committed_model())
+
+
+@app.route("/model/<model_hash>")
+def model_by_hash(model_hash):
+    entry = wclient.numpy_client.model_store.get(model_hash)
+    if not entry:
+        abort(404)
+
+    return send_model(entry)
 
-    return {
-        "model_hash": info["model_hash"],
-        "serialized_model": info["serialized_model"],
-        "last_acc": info["last_acc"],
-        "highest_acc": info["highest_acc"],
-        "parameter_count": info["parameter_count"],
-        "epsilon": info["epsilon"],
-    }
+
+@app.route("/model/info")
+def model_info():
+    from src.models.utils import client_model_info
+
+    return client_model_info(wclient)
 
 
 @app.route("/model/hash")
 def model_info_hash():
+    from src.models.utils import client_model_info
+
     info = client_model_info(wclient)
 
     return {"model_hash": info["model_hash"]}
@@ -91,6 +243,9 @@ def model_info_hash():
 
 @app.route("/evaluate", methods=["POST"])
 def evaluate_model():
+    from flwr.common.typing import EvaluateIns
+    from src.models.utils import deserialize_model
+
     serialized_model = request.data
     parameters_res = deserialize_model(serialized_model)
     parameters = parameters_res.parameters
@@ -103,8 +258,18 @@ def evaluate_model():
 
 @app.route("/endorse/evaluate", methods=["POST"])
 def evaluate_rwset():
-    rwSet = json.loads(request.data)
+    # Endorse a bounded number of requests at once, the rest get 503 and Retry-After,
+    # which the ESCC plugin retries a few times before failing the endorsement
+    try:
+        with admission.admit():
+            return endorse_rwset(json.loads(request.data))
+    except Overloaded:
+        return {"status": 503}, 503, {"Retry-After": str(ENDORSE_RETRY_AFTER)}
+
+
+def endorse_rwset(rwSet: dict):
     nsRwSets = rwSet["NsRwSets"]
+    models = []
     for nsRwSet in nsRwSets:
         ns = nsRwSet["NameSpace"]
         kvRwSet = nsRwSet["KvRwSet"]
@@ -122,25 +287,36 @@ def evaluate_rwset():
                     return {"status": 200}, 200
 
                 _, bc_model = write["key"], json.loads(base64.b64decode(write["value"]))
+                models.append((bc_model["Server"], bc_model["Hash"]))
 
-                res = requests.get(f"{bc_model['Server']}/model").json()
-                serialized_model = bytes.fromhex(res["serialized_model"])
-                model_hash = res["model_hash"]
+    # check if models are good (and match their hash), fetched and evaluated together
+    with profiler.span("endorse", models=len(models)):
+        endorsed = not models or endorsement.endorse(models)
+    if not endorsed:
+        abort(418)  # if not tell them they cant have coffee
 
-                parameters_res = deserialize_model(serialized_model)
-                parameters = parameters_res.parameters
-                info = model_info(parameters_res)
+    # return eval
+    return {"status": 200}, 200
 
-                # check if the claimed hash matches the actual from parameters
-                if model_hash != info["model_hash"]:
-                    abort(418)  # if not tell them they cant have coffee
 
-                # check if model is good
-                if not endorse_model(wclient, parameters):
-                    abort(418)  # if not tell them they cant have coffee
+@app.route("/endorse/stats")
+def endorse_stats():
+    return endorsement.stats()
 
-    # return eval
-    return {"status": 200}, 200
+
+@app.route("/metrics")
+def metrics():
+    return {
+        "profiling": profiler.enabled,
+        "spans": profiler.metrics(),
+        "endorsement": endorsement.stats(),
+        "admission": admission.stats(),
+    }
+
+
+@app.route("/metrics/trace")
+def metrics_trace():
+    return profiler.trace()
 
 
 if __name__ == "__main__":
@@ -149,14 +325,27 @@ if __name__ == "__main__":
             f"Env varialbe 'TEST_SIMULATE_ENDORSE', is set to {TEST_SIMULATE_ENDORSE}, Only use this during testing"
         )
 
-    # Start flower
-    client = client_pipeline(
-        client_id=TEST_SIMULATE_CLIENT_ID, num_clients=TEST_SIMULATE_CLIENTS_COUNT
-    )
-    wclient = NumPyClientWrapper(client)
-    start_client = lambda server_address: fl.client.start_numpy_client(
-        server_address, client=client
-    )
-
-    # Start Flask
-    app.run(host="0.0.0.0", port=PORT, threaded=True, processes=1)
+    jobs = JobRunner()
+    admission = AdmissionQueue()
+    connection, connection_address = None, None
+
+    # Listen straight away and load in the background, /health says when ready
+    if CLIENT_FAST_START:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    else:
+        warm_up()
+
+    # Start Flask, behind waitress in production for a bounded pool of threads
+    if CLIENT_WSGI_SERVER == "waitress":
+        from waitress import serve
+
+        serve(
+            app,
+            host="0.0.0.0",
+            port=PORT,
+            threads=SERVE_THREADS,
+            connection_limit=SERVE_CONNECTION_LIMIT,
+            backlog=SERVE_BACKLOG,
+        )
+    else:
+        app.run(host="0.0.0.0", port=PORT, threaded=True, processes=1)
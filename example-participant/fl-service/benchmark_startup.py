@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+from src.orchestration import probe_http
+from src.orchestration.clients import worker_output
+from src.utils.constants import READY_POLL_INTERVAL, READY_TIMEOUT
+
+parser = argparse.ArgumentParser(description="Benchmark app.py worker cold start")
+
+parser.add_argument(
+    "--runs",
+    "-n",
+    type=int,
+    help="Number of cold starts to time per mode",
+    default=3,
+)
+parser.add_argument(
+    "--port",
+    "-p",
+    type=int,
+    help="Port the worker listens on",
+    default=3900,
+)
+parser.add_argument(
+    "--fast-start",
+    choices=["True", "False", "both"],
+    help="Time workers with fast start on, off, or both",
+    default="both",
+)
+
+
+def time_startup(port: int, fast_start: str):
+    """Start a worker, returning the seconds until it listens and until it is healthy."""
+    env_vars = os.environ.copy()
+    env_vars["PORT"] = str(port)
+    env_vars["CLIENT_FAST_START"] = fast_start
+
+    start = time.perf_counter()
+    with worker_output(f"benchmark-{port}") as output:
+        process = subprocess.Popen([sys.executable, "app.py"], env=env_vars, **output)
+
+    listening = None
+    try:
+        while time.perf_counter() - start < READY_TIMEOUT:
+            if process.poll() is not None:
+                raise RuntimeError(
+                    f"app.py exited with {process.returncode}, see its log"
+                )
+            if listening is None and probe_http(f"http://localhost:{port}/"):
+                listening = time.perf_counter() - start
+            if listening is not None and probe_http(f"http://localhost:{port}/health"):
+                return listening, time.perf_counter() - start
+            time.sleep(READY_POLL_INTERVAL)
+
+        raise TimeoutError(f"app.py not healthy after {READY_TIMEOUT}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    modes = ["True", "False"] if args.fast_start == "both" else [args.fast_start]
+
+    for fast_start in modes:
+        timings = [time_startup(args.port, fast_start) for _ in range(args.runs)]
+        for idx, (listening, healthy) in enumerate(timings):
+            print(
+                f"fast_start={fast_start} run {idx}: "
+                f"listening {listening:.2f}s, healthy {healthy:.2f}s"
+            )
+        print(
+            f"fast_start={fast_start} median: "
+            f"listening {statistics.median(t[0] for t in timings):.2f}s, "
+            f"healthy {statistics.median(t[1] for t in timings):.2f}s"
+        )
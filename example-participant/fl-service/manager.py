@@ -1,26 +1,30 @@
 import os
-import time
+import sys
 import glob
 import argparse
-import threading
-import subprocess
-from typing import Any, List
-from dataclasses import dataclass
-
-import flwr as fl
-from flwr.common import (
-    parameters_to_weights,
-    weights_to_parameters,
-)
-from flwr.server.strategy.aggregate import aggregate
+from typing import Dict, List
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from flwr.common import weights_to_parameters
 from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
 
 from src.server import server_pipeline
-from src.client import client_pipeline
+from src.simulation import ParallelShardExecutor
+from src.datasets import mnist_shared
 from src.fabric.chaincode import query_chaincode
-from src.models.utils import load_model, save_model
+from src.models.utils import load_weights, save_weights
+from src.strategies import GlobalAggregator
 from src.utils import shard_balancers
+from src.orchestration import (
+    ClientInfo,
+    RoundOrchestrator,
+    Supervisor,
+    Worker,
+    create_fabric_client,
+    create_fl_client,
+)
 
 parser = argparse.ArgumentParser(description="Run Federated Learning")
 
@@ -39,6 +43,13 @@ parser.add_argument(
     help="Number of shards available",
     default=2,
 )
+parser.add_argument(
+    "--rounds",
+    "-r",
+    type=int,
+    help="Run this many FL rounds back to back without the menu, then exit",
+    default=0,
+)
 parser.add_argument(
     "--skip-client-creation",
     action="store_false",
@@ -58,6 +69,18 @@ parser.add_argument(
     help="Starting port to launch flower server",
     default=8080,
 )
+parser.add_argument(
+    "--async-staleness-alpha",
+    type=float,
+    help="Merge shard models into the global model asynchronously, with this mixing weight",
+    default=None,
+)
+parser.add_argument(
+    "--cpus-per-shard",
+    type=int,
+    help="CPUs given to each shard when simulating shards in parallel (default: even split)",
+    default=0,
+)
 parser.add_argument(
     "--differential-privacy",
     "-dp",
@@ -86,127 +109,23 @@ parser.add_argument(
 )
 
 
-@dataclass
-class ClientInfo:
-    shard_id: int
-    client_id: int
-    server_port: int = 8080
-    app_server: str = "http://localhost"
-    fabric_server: str = "http://localhost"
-    app_process: Any = None
-    fabric_process: Any = None
-
-    _app_starting_port = 3000
-    _fabric_starting_port = 5000
-
-    @property
-    def app_port(self):
-        return self.shard_id + ClientInfo._app_starting_port
-
-    @property
-    def fabric_port(self):
-        return self.shard_id + ClientInfo._fabric_starting_port
-
-    @property
-    def app_url(self):
-        return f"{self.app_server}:{self.app_port}"
-
-    @property
-    def fabric_url(self):
-        return f"{self.fabric_server}:{self.fabric_port}"
-
-
-def create_fl_client(
-    client_info: ClientInfo,
-    num_clients: int = 0,
-    use_gpu: bool = True,
-    num_threads: bool = 0,
-    use_dp: bool = True,
-    verbose: bool = False,
-):
-    env_vars = os.environ.copy()
-    env_vars["PORT"] = str(client_info.app_port)
-    env_vars["SERVER_PORT"] = str(client_info.server_port)
-    env_vars["CLIENT_USE_GPU"] = str(use_gpu)
-    env_vars["CLIENT_NUM_THREADS"] = str(num_threads)
-    env_vars["CLIENT_USE_DIFFERENTIAL_PRIVACY"] = str(use_dp)
-    env_vars["FABRIC_CHANNEL"] = f"shard{client_info.shard_id}"
-    env_vars["CHAINCODE_CONTRACT"] = f"models{client_info.shard_id}"
-    env_vars["TEST_SIMULATE_CLIENT_ID"] = str(client_info.client_id)
-    env_vars["TEST_SIMULATE_CLIENTS_COUNT"] = str(num_clients)
-
-    verbosity = (
-        {} if verbose else {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
-    )
-    app_client = subprocess.Popen(["python", "app.py"], env=env_vars, **verbosity)
-
-    return app_client
-
-
-def create_fabric_client(client_info: ClientInfo, verbose: bool = False):
-    env_vars = os.environ.copy()
-    env_vars["PORT"] = str(client_info.fabric_port)
-    env_vars["SHARD_ID"] = str(client_info.shard_id)
-
-    verbosity = (
-        {} if verbose else {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
-    )
-    fabric_client = subprocess.Popen(
-        ["npm", "run", "start"],
-        env=env_vars,
-        cwd=os.path.join(os.getcwd(), "../fabric-sdk"),
-        **verbosity,
-    )
-
-    return fabric_client
-
-
 def ensure_fabric_clients(verbose: bool = False):
-    created_client = False
+    # One SDK server per shard, they listen on the shard's port
+    created_workers: Dict[int, Worker] = {}
     for client in clients:
         if not client.fabric_process:
-            fabric_ps = create_fabric_client(client, verbose=verbose)
-            print(f"Creating Fabric Client {client.client_id}: {client.fabric_url}")
-
-            client.fabric_process = fabric_ps
-
-            created_client = True
-
-    if created_client:
-        time.sleep(5)
-
-
-def start_round(num_clients: int = 0, server_port: int = 8080):
-    # Bug with flower causes simulations to fail if grequests is imported
-    # See: https://github.com/mher/flower/issues/819
-    import grequests
-
-    print(f"Starting FL round: {round}")
-    strategy, config = server_pipeline(num_clients=num_clients)
-    start_server = lambda server_adress: fl.server.start_server(
-        server_address=f"localhost:{server_adress}",
-        config=config,
-        strategy=strategy,
-    )
-
-    fl_server_thread = threading.Thread(target=lambda: start_server(server_port))
-    fl_server_thread.setDaemon(True)
-    fl_server_thread.start()
-
-    time.sleep(2)
-
-    reqs = []
-    for client in clients:
-        reqs.append(
-            grequests.get(f"{client.app_url}/round/start", params={"round": round})
-        )
+            if client.shard_id not in created_workers:
+                print(f"Creating Fabric Client {client.shard_id}: {client.fabric_url}")
+                created_workers[client.shard_id] = supervisor.launch(
+                    f"fabric-{client.shard_id}",
+                    partial(create_fabric_client, client, verbose=verbose),
+                    port=client.fabric_port,
+                )
 
-    ress = grequests.map(reqs)
-    for idx, res in enumerate(ress):
-        client_info = res.json()
-        print(f"FL Client {idx}: acc {client_info['last_acc']}")
+            client.fabric_process = created_workers[client.shard_id]
 
-    fl_server_thread.join()
+    # Wait for the SDK servers to listen, rather than a fixed delay
+    supervisor.wait_ready(created_workers.values())
 
 
 def simulate_fl(
@@ -214,52 +133,97 @@ def simulate_fl(
     num_shards: int = 0,
     num_epochs: int = 15,
     output_file: str = "model/eval.output",
+    staleness_alpha: float = None,
+    cpus_per_shard: int = 0,
 ):
     print(f"Starting FL simulation")
-    client_fn = lambda cid: client_pipeline(
-        client_id=int(cid), num_clients=num_clients, lock_inference=False
-    )
     global_strategy, _ = server_pipeline(num_clients=num_clients, server_defence=True)
 
+    # Shards push their aggregates in memory, and are folded into the global model
+    aggregator = GlobalAggregator(
+        weights=(
+            load_weights("model/latest-weights.ckpt")
+            if os.path.exists("model/latest-weights.ckpt")
+            else None
+        ),
+        staleness_alpha=staleness_alpha,
+    )
+
     with open(output_file, "w") as file:
         file.write("loss,accuracy\n")
 
-    for _ in range(num_epochs):
-        for shard_id in range(num_shards):
-            strategy, config = server_pipeline(
-                config={"num_rounds": 1},
-                num_clients=num_clients,
-                server_defence=True,
-                save_model_path=f"model/shard/{shard_id}/latest-weights.pkl",
-                load_model_path=f"model/latest-weights.pkl",
-            )
-
-            fl.simulation.start_simulation(
-                client_fn=client_fn,
-                num_clients=num_clients,
-                client_resources={"num_cpus": 1},
-                **config,
-                strategy=strategy,
-            )
-
-        weights_results = [
-            (
-                parameters_to_weights(
-                    load_model(f"model/shard/{shard_id}/latest-weights.pkl")
-                ),
-                1,
-            )
-            for shard_id in range(num_shards)
-        ]
-        parameters = weights_to_parameters(aggregate(weights_results))
-        save_model(parameters, file="model/latest-weights.pkl")
-
-        loss, metrics = global_strategy.evaluate(parameters)
+    # Evaluate the global model in the background, while the next epoch trains
+    def evaluate_global(weights):
+        loss, metrics = global_strategy.evaluate(weights_to_parameters(weights))
 
         # Write loss and metric outputs
         with open(output_file, "a") as file:
             file.write(f"{loss},{metrics['accuracy']}\n")
 
+    def publish_global():
+        weights = aggregator.finalize()
+        if weights is not None:
+            save_weights(weights, file="model/latest-weights.ckpt")
+            evaluations.append(evaluator.submit(evaluate_global, weights))
+
+    evaluator = ThreadPoolExecutor(max_workers=1)
+    evaluations = []
+    shard_executor = ParallelShardExecutor(
+        num_shards, num_clients, cpus_per_shard=cpus_per_shard
+    )
+    print(
+        f"Training {num_shards} shards with {shard_executor.cpus_per_shard} CPUs each"
+    )
+
+    # Each shard trains from the latest global model, and pushes back the version it
+    # started from. Synchronous epochs wait for every shard, asynchronous shards
+    # start their next epoch as soon as they finish
+    submit_shard = lambda shard_id: shard_executor.submit(
+        shard_id, aggregator.version, aggregator.parameters
+    )
+    shard_epochs = [0] * num_shards
+    waiting = []
+    pending = {submit_shard(shard_id) for shard_id in range(num_shards)}
+    with shard_executor:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                shard_epochs[result.shard_id] += 1
+                print(
+                    f"Shard {result.shard_id} epoch {shard_epochs[result.shard_id]}: "
+                    f"{result.elapsed:.2f}s"
+                )
+                if result.parameters:
+                    aggregator.push(
+                        result.shard_id,
+                        result.parameters,
+                        result.num_examples,
+                        result.version,
+                    )
+
+                if aggregator.asynchronous:
+                    if sum(shard_epochs) % num_shards == 0:
+                        publish_global()
+                    if shard_epochs[result.shard_id] < num_epochs:
+                        waiting.append(result.shard_id)
+
+                    # Before the first global model, a resubmitted shard would train
+                    # from its own initialisation again and be averaged in twice
+                    if aggregator.weights is not None:
+                        pending.update(submit_shard(shard_id) for shard_id in waiting)
+                        waiting.clear()
+
+            if not aggregator.asynchronous and not pending:
+                publish_global()
+                if min(shard_epochs) < num_epochs:
+                    pending = {submit_shard(shard_id) for shard_id in range(num_shards)}
+
+    evaluator.shutdown(wait=True)
+    # Raise evaluation errors instead of dropping them with the futures
+    for evaluation in evaluations:
+        evaluation.result()
+
 
 # actions
 START_FL = "start-fl"
@@ -271,6 +235,8 @@ DELETE_FABRIC_WALLET = "delete-wallets"
 
 # local
 clients: List[ClientInfo] = []
+orchestrator: RoundOrchestrator = None
+supervisor = Supervisor()
 round = 0
 
 
@@ -283,6 +249,9 @@ if __name__ == "__main__":
         ClientInfo._app_starting_port = args.port
         ClientInfo._fabric_starting_port = args.port + 2000
 
+        # Preprocess the dataset once, clients map it rather than each loading a copy
+        mnist_shared()
+
         # Start Clients
         for idx in range(args.participants):
             # Obtain the shardId
@@ -291,21 +260,40 @@ if __name__ == "__main__":
                 shard_id=shard_id, client_id=idx, server_port=args.server_port
             )
             if args.skip_client_creation:
-                fl_ps = create_fl_client(
-                    client_info=client_info,
-                    num_clients=args.participants,
-                    use_gpu=args.gpu,
-                    num_threads=args.num_threads,
-                    use_dp=args.differential_privacy,
-                    verbose=args.verbose,
+                client_info.app_process = supervisor.launch(
+                    f"app-{client_info.client_id}",
+                    partial(
+                        create_fl_client,
+                        client_info=client_info,
+                        num_clients=args.participants,
+                        use_gpu=args.gpu,
+                        num_threads=args.num_threads,
+                        use_dp=args.differential_privacy,
+                        verbose=args.verbose,
+                    ),
+                    health_url=f"{client_info.app_url}/health",
                 )
-                client_info.app_process = fl_ps
                 print(
                     f"Creating FL Client {client_info.client_id}: {client_info.app_url}"
                 )
 
             clients.append(client_info)
 
+        # Clients start concurrently, report how long each took to be healthy
+        if not supervisor.wait_ready():
+            print("Some FL Clients failed to start, see their logs")
+
+        orchestrator = RoundOrchestrator(
+            clients, num_clients=args.participants, server_port=args.server_port
+        )
+
+        # Headless, run the rounds and exit
+        if args.rounds:
+            ensure_fabric_clients(verbose=args.verbose)
+            orchestrator.wait_ready()
+            orchestrator.run(args.rounds, first_round=round + 1)
+            sys.exit()
+
         # Start flower
         while action := inquirer.select(
             message="What's next?",
@@ -326,10 +314,16 @@ if __name__ == "__main__":
             if action == START_FL:
                 round += 1
                 ensure_fabric_clients(verbose=args.verbose)
-                start_round(num_clients=args.participants, server_port=args.server_port)
+                orchestrator.wait_ready()
+                orchestrator.run(1, first_round=round)
             if action == SIMULATE_FL:
                 # ensure_fabric_clients(verbose=args.verbose)
-                simulate_fl(num_clients=args.participants, num_shards=args.shards)
+                simulate_fl(
+                    num_clients=args.participants,
+                    num_shards=args.shards,
+                    staleness_alpha=args.async_staleness_alpha,
+                    cpus_per_shard=args.cpus_per_shard,
+                )
             elif action.startswith(GET_MODELS):
                 ensure_fabric_clients(verbose=args.verbose)
                 shard_id = int(action[len(GET_MODELS) :])
@@ -348,7 +342,7 @@ if __name__ == "__main__":
                 ensure_fabric_clients(verbose=args.verbose)
                 print(query_chaincode("mainline", "catalyst", "GetAllShards", []))
             elif action == DELETE_MODEL_CHECKPOINT:
-                model_files = glob.glob("model/*.pkl", recursive=True)
+                model_files = glob.glob("model/*.ckpt", recursive=True)
                 if not model_files:
                     print("No checkpoints to delete!")
                 else:
@@ -373,8 +367,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"manager.py Error: {e.with_traceback()}")
     finally:
-        for client in clients:
-            if client.app_process:
-                client.app_process.terminate()
-            if client.fabric_process:
-                client.fabric_process.terminate()
+        if orchestrator:
+            orchestrator.close()
+        supervisor.stop()
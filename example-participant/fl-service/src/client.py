@@ -1,31 +1,36 @@
 import os
 import copy
+import timeit
 import typing
+import dataclasses
 import warnings
 import threading
+from contextlib import nullcontext
 from logging import INFO, log
 
 import flwr as fl
-from flwr.common import weights_to_parameters, ParametersRes
+from flwr.client.numpy_client import NumPyClientWrapper
+from flwr.common import FitIns, FitRes, parameters_to_weights, weights_to_parameters
 from opacus import PrivacyEngine
 
 from .models.simple_cnn import create_model
-from .models.evaluation.train_cls import train, test
+from .models.evaluation.train_cls import PrivateSession, train, test
 from .models.utils import (
     get_parameters,
     set_parameters,
     count_parameters,
-    model_info,
     ModelCheckpointInfo,
+    ModelEntry,
+    ModelStore,
 )
 from .datasets import cifar10_noniid, mnist_noniid
+from .utils.profiling import profiler
 from .utils.constants import (
     DEFAULT_BATCH_SIZE,
     DEFAULT_LOCAL_EPOCHS,
     PRIVACY_TARGET_DELTA,
 )
 
-
 warnings.filterwarnings("ignore", category=UserWarning)
 
 
@@ -38,12 +43,16 @@ class CifarClient(fl.client.NumPyClient):
         testloader,
         *args,
         post_model: typing.Callable[[], typing.Dict] = None,
+        on_progress: typing.Callable[[typing.Dict], None] = None,
+        on_fit_end: typing.Callable[[], None] = None,
         differential_privacy=True,
         lock_inference=True,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
         self.post_model = post_model
+        self.on_progress = on_progress
+        self.on_fit_end = on_fit_end
         self.checkpoint_info = ModelCheckpointInfo(
             parameter_count=count_parameters(model)
         )
@@ -51,62 +60,138 @@ class CifarClient(fl.client.NumPyClient):
         # Worker lock
         self.lock = threading.RLock() if lock_inference else None
 
-        # Model
+        # Model, and the hash of its current weights (None until resolved)
         self.model = model
+        self.model_store = ModelStore()
+        self.model_hash = None
 
         # Dataset loaders
         self.trainloader = trainloader
         self.testloader = testloader
 
-        # Differential Privacy Engine
+        # Differential Privacy Engine, and its training session (made on first fit)
         self.privacy_engine = PrivacyEngine() if differential_privacy else None
+        self._private_session = None
+
+        # Last completed model, served to peers without waiting on training
+        self.commit(self.current_model())
+
+    def locked(self):
+        return self.lock or nullcontext()
+
+    def busy(self) -> bool:
+        """Whether another thread holds the worker lock, e.g. while training."""
+        if not self.lock:
+            return False
+        if not self.lock.acquire(blocking=False):
+            return True
+        self.lock.release()
+        return False
 
     def get_parameters(self):
         return get_parameters(self.model)
 
     def set_parameters(self, parameters):
+        # Weights from a stored checkpoint keep their hash, others are hashed lazily
+        entry = self.model_store.find(parameters)
+        if entry and entry.model_hash == self.model_hash:
+            return  # already loaded, e.g. evaluating the model just trained
+
         set_parameters(self.model, parameters)
+        self.model_hash = entry.model_hash if entry else None
+
+    def current_model(self) -> ModelEntry:
+        """Return the stored checkpoint of the current weights, serializing only on change."""
+        with self.locked():
+            entry = self.model_hash and self.model_store.get(self.model_hash)
+            if not entry:
+                entry = self.model_store.put(self.get_parameters())
+                self.model_hash = entry.model_hash
+
+            return entry
+
+    def commit(self, entry: ModelEntry):
+        """Publish a model and its checkpoint info as one snapshot."""
+        self.committed = (
+            entry,
+            dataclasses.replace(self.checkpoint_info, model_hash=entry.model_hash),
+        )
+
+    def committed_model(self) -> ModelEntry:
+        return self.committed[0]
+
+    @property
+    def committed_info(self) -> ModelCheckpointInfo:
+        return self.committed[1]
+
+    def private_session(self) -> PrivateSession:
+        if not self._private_session:
+            self._private_session = PrivateSession(
+                self.model, self.trainloader, self.privacy_engine
+            )
+        return self._private_session
+
+    def report_progress(self, **progress):
+        if self.on_progress:
+            self.on_progress(progress)
 
     def fit(self, parameters, config={}):
-        if self.lock:
-            self.lock.acquire()
-        try:
+        with profiler.span("fit"), self.locked():
             # Train model
-            self.set_parameters(parameters)
-            train(
-                self.model,
-                self.trainloader,
+            with profiler.span("fit.set_parameters"):
+                self.set_parameters(parameters)
+            self.model_hash = None
+            on_epoch_end = lambda epoch, loss: self.report_progress(
+                stage="training",
+                epoch=epoch + 1,
                 epochs=DEFAULT_LOCAL_EPOCHS,
-                privacy_engine=self.privacy_engine,
+                loss=loss,
             )
+            with profiler.span("fit.train", epochs=DEFAULT_LOCAL_EPOCHS):
+                if self.privacy_engine:
+                    self.private_session().train(
+                        epochs=DEFAULT_LOCAL_EPOCHS, on_epoch_end=on_epoch_end
+                    )
+                else:
+                    train(
+                        self.model,
+                        self.trainloader,
+                        epochs=DEFAULT_LOCAL_EPOCHS,
+                        on_epoch_end=on_epoch_end,
+                    )
 
             # Privacy metrics
             privacy_info = {}
             if self.privacy_engine:
-                self.checkpoint_info.epsilon = self.privacy_engine.get_epsilon(
-                    PRIVACY_TARGET_DELTA
-                )
+                with profiler.span("fit.privacy_accounting"):
+                    self.checkpoint_info.epsilon = self.privacy_engine.get_epsilon(
+                        PRIVACY_TARGET_DELTA
+                    )
                 privacy_info = {"epsilon": self.checkpoint_info.epsilon}
 
             # Update checkpoint
-            local_update = self.get_parameters()
-            local_update_proto = weights_to_parameters(local_update)
-            local_parameters_res = ParametersRes(parameters=local_update_proto)
-            local_model_info = model_info(local_parameters_res)
-            self.checkpoint_info.model_hash = local_model_info["model_hash"]
-            self.checkpoint_info.serialized_model = local_model_info["serialized_model"]
+            with profiler.span("fit.checkpoint"):
+                entry = self.current_model()
+            local_update = entry.weights
+            self.checkpoint_info.model_hash = entry.model_hash
 
             # If we are posting the model to the blockchain, evaluate it
             if self.post_model:
-                self.evaluate(local_update)
+                self.report_progress(stage="evaluating")
+                with profiler.span("fit.evaluate"):
+                    self.evaluate(local_update)
                 checkpoint = copy.copy(self.checkpoint_info)
-        finally:
-            if self.lock:
-                self.lock.release()
+
+            self.commit(entry)
 
         # Post model to the blockchain
         if self.post_model:
-            self.post_model(checkpoint)
+            self.report_progress(stage="posting")
+            with profiler.span("fit.post_model"):
+                self.post_model(checkpoint)
+
+        if self.on_fit_end:
+            self.on_fit_end()
 
         return (
             local_update,
@@ -115,22 +200,39 @@ class CifarClient(fl.client.NumPyClient):
         )
 
     def evaluate(self, parameters, config={}):
-        if self.lock:
-            self.lock.acquire()
-        try:
+        with self.locked():
             self.set_parameters(parameters)
             loss, accuracy = test(self.model, self.testloader)
             self.checkpoint_info.last_acc = accuracy
             self.checkpoint_info.highest_acc = max(
                 self.checkpoint_info.highest_acc, accuracy
             )
-        finally:
-            self.lock.release()
 
         log(INFO, f"accuracy: {accuracy}")
         return float(loss), len(self.testloader), {"accuracy": float(accuracy)}
 
 
+class StoreClientWrapper(NumPyClientWrapper):
+    """Flower client sending fit results as the Parameters already serialized by
+    the client's model store, instead of serializing the weights again."""
+
+    def fit(self, ins: FitIns) -> FitRes:
+        fit_begin = timeit.default_timer()
+        weights, num_examples, metrics = self.numpy_client.fit(
+            parameters_to_weights(ins.parameters), ins.config
+        )
+
+        # Trained weights are handed out by the store, unless already evicted
+        entry = self.numpy_client.model_store.find(weights)
+        return FitRes(
+            parameters=entry.parameters if entry else weights_to_parameters(weights),
+            num_examples=num_examples,
+            num_examples_ceil=num_examples,
+            fit_duration=timeit.default_timer() - fit_begin,
+            metrics=metrics,
+        )
+
+
 def client_pipeline(
     client_id: int = 0, num_clients: int = 0, lock_inference: bool = True
 ):
@@ -162,4 +264,4 @@ def client_pipeline(
 
 if __name__ == "__main__":
     client = client_pipeline()
-    fl.client.start_numpy_client("localhost:8080", client=client)
+    fl.client.start_client("localhost:8080", client=StoreClientWrapper(client))
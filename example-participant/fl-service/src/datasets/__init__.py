@@ -1,2 +1,3 @@
 from .datasets import *
+from .partition import *
 from .visualize import *
@@ -0,0 +1,85 @@
+import os
+import tempfile
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, TensorDataset
+
+from ..utils.constants import DATASET_CACHE_DIR, DEFAULT_BATCH_SIZE
+
+# ToTensor + Normalize parameters of the torchvision transforms in datasets.py
+NORMALIZATION = {
+    "mnist": ((0.1307,), (0.3081,)),
+    "cifar10": ((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
+}
+
+
+def preprocess(dataset, name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply ToTensor and Normalize to a torchvision dataset in one vectorized pass."""
+    data, labels = np.asarray(dataset.data), np.asarray(dataset.targets)
+
+    # NxHxW (grayscale) or NxHxWxC to NxCxHxW
+    images = data.astype(np.float32) / 255
+    images = images[:, None] if images.ndim == 3 else images.transpose(0, 3, 1, 2)
+
+    mean, std = (
+        np.array(v, dtype=np.float32).reshape(1, -1, 1, 1) for v in NORMALIZATION[name]
+    )
+    images = (images - mean) / std
+
+    return np.ascontiguousarray(images), labels.astype(np.int64)
+
+
+def _cache_path(key: str, array: str) -> str:
+    return os.path.join(DATASET_CACHE_DIR, f"{key}-{array}.npy")
+
+
+def save_arrays(key: str, arrays: Dict[str, np.ndarray]):
+    os.makedirs(DATASET_CACHE_DIR, exist_ok=True)
+    for array, values in arrays.items():
+        # Write then rename, other client processes may be reading the cache
+        fd, tmp_file = tempfile.mkstemp(dir=DATASET_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, values, allow_pickle=False)
+        os.replace(tmp_file, _cache_path(key, array))
+
+
+def load_arrays(
+    key: str, arrays: Sequence[str], mmap_mode: Optional[str] = None
+) -> Optional[Dict[str, np.ndarray]]:
+    paths = {array: _cache_path(key, array) for array in arrays}
+    if not all(os.path.exists(path) for path in paths.values()):
+        return None
+
+    return {
+        array: np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        for array, path in paths.items()
+    }
+
+
+def shared_dataset(
+    name: str, load_dataset: Callable[[], Dataset], split: str = "train"
+) -> Dict[str, np.ndarray]:
+    """Preprocessed full dataset as read-only memory maps.
+
+    Every process maps the same files, so the data is held once in the page cache
+    and each process only pays for the samples it copies out.
+    """
+    key, arrays = f"{name}-{split}", ["images", "labels"]
+    dataset = load_arrays(key, arrays, mmap_mode="r")
+    if dataset is None:
+        save_arrays(key, dict(zip(arrays, preprocess(load_dataset(), name))))
+        dataset = load_arrays(key, arrays, mmap_mode="r")
+
+    return dataset
+
+
+def tensor_loader(
+    images: np.ndarray,
+    labels: np.ndarray,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    shuffle: bool = False,
+) -> DataLoader:
+    dataset = TensorDataset(torch.from_numpy(images), torch.from_numpy(labels))
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
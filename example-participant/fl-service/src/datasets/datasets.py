@@ -1,4 +1,5 @@
 from math import floor
+from typing import Callable
 
 import torch
 import numpy as np
@@ -6,6 +7,8 @@ import torchvision.transforms as transforms
 from torch.utils.data import Dataset, DataLoader, Subset, random_split
 from torchvision.datasets import CIFAR10, MNIST
 
+from .cache import load_arrays, save_arrays, shared_dataset, tensor_loader
+from .partition import client_partition, plan_key, plan_partitions
 from .utils.leaf import FEMNIST
 from ..utils.constants import (
     CIFAR10_SHARDS,
@@ -15,7 +18,6 @@ from ..utils.constants import (
     SEED,
 )
 
-
 transform_cifar10 = transforms.Compose(
     [transforms.ToTensor(), transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
 )
@@ -61,39 +63,14 @@ def dataset_noniid(
     batch_size: int = DEFAULT_BATCH_SIZE,
 ):
     """Load non-IID Dataset (training and test set)."""
-    num_imgs = len(dataset) // num_shards
-    num_clients = max(num_clients, 1)
-    shards_per = num_shards // num_clients
-    np.random.seed(SEED)
-    # Partition data
-    shard_idxs = np.arange(num_shards)
-    sample_idxs = np.arange(num_imgs * num_shards)
-    sample_labels = np.array(dataset.targets)
-
-    # Sort
-    sample_pairs = np.vstack((sample_idxs, sample_labels))
-    sample_pairs = sample_pairs[:, sample_pairs[1, :].argsort()]
-    sample_idxs = sample_pairs[0, :]
-
-    # Divide and assign
-    np.random.shuffle(shard_idxs)
-    client_shards = shard_idxs[client_id * shards_per : (client_id + 1) * shards_per]
-    client_samples = np.concatenate(
-        tuple(
-            sample_idxs[x * num_imgs : x * num_imgs + num_imgs]
-            for x in np.nditer(client_shards)
-        )
+    plan = plan_partitions(
+        np.asarray(dataset.targets), num_clients, "shards", num_shards=num_shards
     )
-
-    # Get Client dataset and splits
-    client_data = Subset(dataset, client_samples)
-    split = floor(DEFAULT_TRAIN_SPLIT * len(client_data))
-    train_idxs = np.arange(len(client_data))
-    np.random.shuffle(train_idxs)
+    train_idxs, test_idxs = client_partition(plan, client_id)
 
     # Client Train & Test set
-    client_trainset = Subset(client_data, train_idxs[:split])
-    client_testset = Subset(client_data, train_idxs[split:])
+    client_trainset = Subset(dataset, train_idxs)
+    client_testset = Subset(dataset, test_idxs)
 
     # Dataloaders
     trainloader = DataLoader(client_trainset, batch_size=batch_size, shuffle=True)
@@ -102,6 +79,68 @@ def dataset_noniid(
     return trainloader, testloader
 
 
+def tensor_noniid(
+    name: str,
+    load_trainset: Callable[[], Dataset],
+    client_id: int = 0,
+    num_clients: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    scheme: str = "shards",
+    **params,
+):
+    """Load non-IID Dataset as preprocessed tensors, cached on disk per client.
+
+    `scheme` and `params` select the partitioner, see `PARTITION_SCHEMES`.
+    """
+    num_clients = max(num_clients, 1)
+    key = f"{plan_key(name, num_clients, scheme, SEED, **params)}-client{client_id}"
+    arrays = ["train-images", "train-labels", "test-images", "test-labels"]
+    partition = load_arrays(key, arrays)
+    if partition is None:
+        # Copy only this client's samples out of the shared dataset
+        dataset = shared_dataset(name, load_trainset)
+        plan = plan_partitions(
+            dataset["labels"], num_clients, scheme, SEED, name=name, **params
+        )
+        train_idxs, test_idxs = client_partition(plan, client_id)
+        partition = {
+            "train-images": dataset["images"][train_idxs],
+            "train-labels": dataset["labels"][train_idxs],
+            "test-images": dataset["images"][test_idxs],
+            "test-labels": dataset["labels"][test_idxs],
+        }
+        save_arrays(key, partition)
+
+    # Dataloaders
+    trainloader = tensor_loader(
+        partition["train-images"],
+        partition["train-labels"],
+        batch_size=batch_size,
+        shuffle=True,
+    )
+    testloader = tensor_loader(
+        partition["test-images"],
+        partition["test-labels"],
+        batch_size=batch_size,
+        shuffle=True,
+    )
+
+    return trainloader, testloader
+
+
+def tensor_test(
+    name: str,
+    load_testset: Callable[[], Dataset],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+):
+    """Load a test set as preprocessed tensors, cached on disk."""
+    testset = shared_dataset(name, load_testset, split="test")
+
+    return tensor_loader(
+        np.array(testset["images"]), np.array(testset["labels"]), batch_size=batch_size
+    )
+
+
 def cifar10_iid(
     client_id: int = 0, num_clients: int = 0, batch_size: int = DEFAULT_BATCH_SIZE
 ):
@@ -115,28 +154,40 @@ def cifar10_iid(
 
 
 def cifar10_noniid(
-    client_id: int = 0, num_clients: int = 0, batch_size: int = DEFAULT_BATCH_SIZE
+    client_id: int = 0,
+    num_clients: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    scheme: str = "shards",
+    **params,
 ):
     """Load non-IID CIFAR-10 (training and test set)."""
-    trainset = CIFAR10(
-        "./dataset", train=True, download=True, transform=transform_cifar10
-    )
-    return dataset_noniid(
-        trainset,
-        CIFAR10_SHARDS,
+    if scheme == "shards":
+        params.setdefault("num_shards", CIFAR10_SHARDS)
+
+    return tensor_noniid(
+        "cifar10",
+        lambda: CIFAR10("./dataset", train=True, download=True),
         client_id=client_id,
         num_clients=num_clients,
         batch_size=batch_size,
+        scheme=scheme,
+        **params,
     )
 
 
-def cifar10_test(batch_size: int = DEFAULT_BATCH_SIZE):
-    testset = CIFAR10(
-        "./dataset", train=False, download=True, transform=transform_cifar10
+def cifar10_shared():
+    """Preprocess CIFAR-10 once, to be shared by every client process."""
+    return shared_dataset(
+        "cifar10", lambda: CIFAR10("./dataset", train=True, download=True)
     )
-    testloader = DataLoader(testset, batch_size=batch_size)
 
-    return testloader
+
+def cifar10_test(batch_size: int = DEFAULT_BATCH_SIZE):
+    return tensor_test(
+        "cifar10",
+        lambda: CIFAR10("./dataset", train=False, download=True),
+        batch_size=batch_size,
+    )
 
 
 def mnist_iid(
@@ -151,24 +202,40 @@ def mnist_iid(
 
 
 def mnist_noniid(
-    client_id: int = 0, num_clients: int = 0, batch_size: int = DEFAULT_BATCH_SIZE
+    client_id: int = 0,
+    num_clients: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    scheme: str = "shards",
+    **params,
 ):
     """Load non-IID MNIST (training and test set)."""
-    trainset = MNIST("./dataset", train=True, download=True, transform=transform_mnist)
-    return dataset_noniid(
-        trainset,
-        MNIST_SHARDS,
+    if scheme == "shards":
+        params.setdefault("num_shards", MNIST_SHARDS)
+
+    return tensor_noniid(
+        "mnist",
+        lambda: MNIST("./dataset", train=True, download=True),
         client_id=client_id,
         num_clients=num_clients,
         batch_size=batch_size,
+        scheme=scheme,
+        **params,
     )
 
 
-def mnist_test(batch_size: int = DEFAULT_BATCH_SIZE):
-    testset = MNIST("./dataset", train=False, download=True, transform=transform_mnist)
-    testloader = DataLoader(testset, batch_size=batch_size)
+def mnist_shared():
+    """Preprocess MNIST once, to be shared by every client process."""
+    return shared_dataset(
+        "mnist", lambda: MNIST("./dataset", train=True, download=True)
+    )
+
 
-    return testloader
+def mnist_test(batch_size: int = DEFAULT_BATCH_SIZE):
+    return tensor_test(
+        "mnist",
+        lambda: MNIST("./dataset", train=False, download=True),
+        batch_size=batch_size,
+    )
 
 
 def leaf_femnist_noniid(
@@ -0,0 +1,197 @@
+import inspect
+from math import floor
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .cache import load_arrays, save_arrays
+from ..utils.constants import (
+    DEFAULT_TRAIN_SPLIT,
+    DIRICHLET_ALPHA,
+    LABEL_SKEW_CLASSES,
+    SEED,
+)
+
+# Every client's (train, test) indices, in CSR form: client i's samples are
+# indices[indptr[i] : indptr[i + 1]]
+PLAN_ARRAYS = ["train-indptr", "train-indices", "test-indptr", "test-indices"]
+
+
+def shard_partition(
+    labels: np.ndarray, num_clients: int, rs: np.random.RandomState, num_shards: int
+) -> np.ndarray:
+    """Sort by label, cut into `num_shards` shards and deal them out to clients.
+
+    Returns a (num_clients, samples per client) array.
+    """
+    num_imgs = len(labels) // num_shards
+    shards_per = num_shards // num_clients
+
+    sample_labels = np.asarray(labels[: num_imgs * num_shards], dtype=np.int64)
+    shards = sample_labels.argsort().reshape(num_shards, num_imgs)
+
+    shard_idxs = np.arange(num_shards)
+    rs.shuffle(shard_idxs)
+
+    return shards[shard_idxs[: num_clients * shards_per]].reshape(num_clients, -1)
+
+
+def dirichlet_partition(
+    labels: np.ndarray,
+    num_clients: int,
+    rs: np.random.RandomState,
+    alpha: float = DIRICHLET_ALPHA,
+) -> np.ndarray:
+    """Split each class across clients in Dirichlet(`alpha`) proportions.
+
+    Returns the client each sample is assigned to.
+    """
+    labels = np.asarray(labels)
+    classes, class_ids = np.unique(labels, return_inverse=True)
+    proportions = rs.dirichlet(np.full(num_clients, alpha), size=len(classes))
+
+    owners = np.empty(len(labels), dtype=np.int64)
+    for class_id in range(len(classes)):
+        (samples,) = np.nonzero(class_ids == class_id)
+        rs.shuffle(samples)
+        bounds = np.cumsum(proportions[class_id])[:-1] * len(samples)
+        owners[samples] = np.searchsorted(bounds, np.arange(len(samples)), side="right")
+
+    return owners
+
+
+def label_skew_partition(
+    labels: np.ndarray,
+    num_clients: int,
+    rs: np.random.RandomState,
+    classes_per_client: int = LABEL_SKEW_CLASSES,
+) -> np.ndarray:
+    """Give each client `classes_per_client` random classes, each class split
+    evenly across the clients holding it. Samples of unheld classes get -1.
+
+    Returns the client each sample is assigned to.
+    """
+    labels = np.asarray(labels)
+    classes, class_ids = np.unique(labels, return_inverse=True)
+    classes_per_client = min(classes_per_client, len(classes))
+    held = np.stack(
+        [
+            rs.choice(len(classes), classes_per_client, replace=False)
+            for _ in range(num_clients)
+        ]
+    )
+
+    owners = np.full(len(labels), -1, dtype=np.int64)
+    for class_id in range(len(classes)):
+        holders = np.nonzero((held == class_id).any(axis=1))[0]
+        if not len(holders):
+            continue
+        (samples,) = np.nonzero(class_ids == class_id)
+        rs.shuffle(samples)
+        owners[samples] = holders[
+            np.arange(len(samples)) * len(holders) // len(samples)
+        ]
+
+    return owners
+
+
+PARTITION_SCHEMES = {
+    "shards": shard_partition,
+    "dirichlet": dirichlet_partition,
+    "label_skew": label_skew_partition,
+}
+
+
+def _split_equal(clients: np.ndarray, rs: np.random.RandomState):
+    # Same permutation for every client, as clients have the same number of samples
+    split = floor(DEFAULT_TRAIN_SPLIT * clients.shape[1])
+    train_idxs = np.arange(clients.shape[1])
+    rs.shuffle(train_idxs)
+
+    num_clients = clients.shape[0]
+    train, test = clients[:, train_idxs[:split]], clients[:, train_idxs[split:]]
+    return {
+        "train-indptr": np.arange(num_clients + 1) * train.shape[1],
+        "train-indices": train.reshape(-1),
+        "test-indptr": np.arange(num_clients + 1) * test.shape[1],
+        "test-indices": test.reshape(-1),
+    }
+
+
+def _split_owners(owners: np.ndarray, num_clients: int, rs: np.random.RandomState):
+    # Group samples by client in a random order, then cut each group at the split
+    (samples,) = np.nonzero(owners >= 0)
+    owners = owners[samples]
+    order = np.lexsort((rs.random_sample(len(samples)), owners))
+    samples, owners = samples[order], owners[order]
+
+    counts = np.bincount(owners, minlength=num_clients)
+    starts = np.concatenate(([0], np.cumsum(counts)))
+    rank = np.arange(len(samples)) - starts[owners]
+    train = rank < np.floor(DEFAULT_TRAIN_SPLIT * counts)[owners]
+
+    train_counts = np.bincount(owners[train], minlength=num_clients)
+    return {
+        "train-indptr": np.concatenate(([0], np.cumsum(train_counts))),
+        "train-indices": samples[train],
+        "test-indptr": np.concatenate(([0], np.cumsum(counts - train_counts))),
+        "test-indices": samples[~train],
+    }
+
+
+def plan_key(name: str, num_clients: int, scheme: str, seed: int, **params) -> str:
+    # Resolve the scheme's defaults and the split, so changing them misses the cache
+    signature = inspect.signature(PARTITION_SCHEMES[scheme]).parameters.values()
+    defaults = {
+        p.name: p.default for p in signature if p.default is not inspect.Parameter.empty
+    }
+    params = {**defaults, **params, "split": DEFAULT_TRAIN_SPLIT}
+    options = "".join(f"-{k}{v}" for k, v in sorted(params.items()))
+    return f"{name}-{scheme}{options}-seed{seed}-clients{num_clients}"
+
+
+def plan_partitions(
+    labels: np.ndarray,
+    num_clients: int = 0,
+    scheme: str = "shards",
+    seed: int = SEED,
+    name: Optional[str] = None,
+    **params,
+) -> Dict[str, np.ndarray]:
+    """Every client's (train, test) indices for a partition scheme.
+
+    With a dataset `name` the plan is computed once and cached on disk, later
+    calls memory map it.
+    """
+    num_clients = max(num_clients, 1)
+    if name is not None:
+        key = plan_key(name, num_clients, scheme, seed, **params)
+        plan = load_arrays(key, PLAN_ARRAYS, mmap_mode="r")
+        if plan is not None:
+            return plan
+
+    rs = np.random.RandomState(seed)
+    assignment = PARTITION_SCHEMES[scheme](labels, num_clients, rs, **params)
+    if assignment.ndim == 2:
+        plan = _split_equal(assignment, rs)
+    else:
+        plan = _split_owners(assignment, num_clients, rs)
+    plan = {k: v.astype(np.int64, copy=False) for k, v in plan.items()}
+
+    if name is not None:
+        save_arrays(key, plan)
+
+    return plan
+
+
+def client_partition(
+    plan: Dict[str, np.ndarray], client_id: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Slice a client's (train, test) indices out of a plan."""
+
+    def client_idxs(split):
+        indptr = plan[f"{split}-indptr"]
+        indices = plan[f"{split}-indices"][indptr[client_id] : indptr[client_id + 1]]
+        return np.asarray(indices)
+
+    return client_idxs("train"), client_idxs("test")
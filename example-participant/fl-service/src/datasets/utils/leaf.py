@@ -1,22 +1,42 @@
 import os
 import json
-from functools import lru_cache
-from collections import defaultdict
+import tempfile
 
 import numpy as np
 from torch.utils.data import Dataset
 
+# Packed LEAF split: every user's samples stored contiguously, float32 HxWxC
+# images and int64 labels, with each user's (offset, count) in the index
+LEAF_PACKED_DIR = "packed"
+LEAF_IMAGE_SHAPE = (28, 28, 1)
+
 
 class FEMNIST(Dataset):
     def __init__(
         self, data_dir, client_id=0, train=True, transform=None, target_transform=None
     ):
         data_dir = os.path.join(data_dir, "train" if train else "test")
-        clients, _, img_data = read_leaf_dir(data_dir)
-        self.client_id = clients[client_id]
-        self.img_data = np.array(img_data[self.client_id]["x"]).reshape(-1, 1, 28, 28)
-        print(self.img_data)
-        self.img_labels = np.array(img_data[self.client_id]["y"])
+        index = load_leaf_index(data_dir)
+        self.client_id = index["users"][client_id]
+
+        # Map only this user's samples, copy-on-write so tensors can wrap them
+        packed_dir = os.path.join(data_dir, LEAF_PACKED_DIR)
+        offset, count = index["offsets"][client_id], index["counts"][client_id]
+        image_size = int(np.prod(index["image_shape"]))
+        self.img_data = np.memmap(
+            os.path.join(packed_dir, "images.bin"),
+            dtype=np.float32,
+            mode="c",
+            offset=offset * image_size * 4,
+            shape=(count, *index["image_shape"]),
+        )
+        self.img_labels = np.memmap(
+            os.path.join(packed_dir, "labels.bin"),
+            dtype=np.int64,
+            mode="c",
+            offset=offset * 8,
+            shape=(count,),
+        )
 
         self.transform = transform
         self.target_transform = target_transform
@@ -34,27 +54,68 @@ class FEMNIST(Dataset):
         return image, label
 
 
+def load_leaf_index(data_dir) -> dict:
+    """Index of a packed LEAF split, packing the JSON files on first use."""
+    index_file = os.path.join(data_dir, LEAF_PACKED_DIR, "index.json")
+    if not os.path.exists(index_file):
+        pack_leaf_dir(data_dir)
+
+    with open(index_file, "r") as f:
+        return json.load(f)
+
+
+def pack_leaf_dir(data_dir, image_shape=LEAF_IMAGE_SHAPE):
+    """Convert a LEAF split's JSON files to packed binary, one file at a time."""
+    packed_dir = os.path.join(data_dir, LEAF_PACKED_DIR)
+    os.makedirs(packed_dir, exist_ok=True)
+
+    offsets, counts = {}, {}
+    images_fd, images_tmp = tempfile.mkstemp(dir=packed_dir, suffix=".tmp")
+    labels_fd, labels_tmp = tempfile.mkstemp(dir=packed_dir, suffix=".tmp")
+    try:
+        with os.fdopen(images_fd, "wb") as images, os.fdopen(labels_fd, "wb") as labels:
+            total = 0
+            for _, user_data in read_leaf_files(data_dir):
+                for user, data in user_data.items():
+                    x = np.asarray(data["x"], dtype=np.float32)
+                    y = np.asarray(data["y"], dtype=np.int64)
+                    images.write(x.reshape(-1, *image_shape).tobytes())
+                    labels.write(y.tobytes())
+
+                    offsets[user], counts[user] = total, len(y)
+                    total += len(y)
+
+        # Index last, its presence marks a complete conversion
+        users = sorted(offsets)
+        index = {
+            "users": users,
+            "offsets": [offsets[user] for user in users],
+            "counts": [counts[user] for user in users],
+            "image_shape": list(image_shape),
+        }
+        os.replace(images_tmp, os.path.join(packed_dir, "images.bin"))
+        os.replace(labels_tmp, os.path.join(packed_dir, "labels.bin"))
+
+        fd, index_tmp = tempfile.mkstemp(dir=packed_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f)
+        os.replace(index_tmp, os.path.join(packed_dir, "index.json"))
+    finally:
+        for tmp_file in (images_tmp, labels_tmp):
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
 #
 # Leaf https://github.com/TalwalkarLab/leaf/blob/master/models/utils/model_utils.py
 #
 
 
-@lru_cache
-def read_leaf_dir(data_dir):
-    clients = []
-    groups = []
-    data = defaultdict(lambda: None)
-
-    files = os.listdir(data_dir)
-    files = [f for f in files if f.endswith(".json")]
+def read_leaf_files(data_dir):
+    """Yield (users, user_data) for each JSON file, only one file held at a time."""
+    files = sorted(f for f in os.listdir(data_dir) if f.endswith(".json"))
     for f in files:
         file_path = os.path.join(data_dir, f)
         with open(file_path, "r") as inf:
             cdata = json.load(inf)
-        clients.extend(cdata["users"])
-        if "hierarchies" in cdata:
-            groups.extend(cdata["hierarchies"])
-        data.update(cdata["user_data"])
-
-    clients = list(sorted(data.keys()))
-    return clients, groups, data
+        yield cdata["users"], cdata["user_data"]
@@ -1,5 +1,89 @@
+import json
 import typing
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from ..utils.constants import FABRIC_CLIENT_POOL_SIZE
+
+
+class ChaincodeClient:
+    """Keep-alive connection pool to a fabric-sdk REST server."""
+
+    def __init__(
+        self, server="localhost", port=5000, pool_size=FABRIC_CLIENT_POOL_SIZE
+    ):
+        self.url = f"http://{server}:{port}"
+        self.session = requests.Session()
+        self.session.mount(
+            "http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        )
+        self.executor = ThreadPoolExecutor(pool_size, thread_name_prefix="chaincode")
+
+    def transaction(
+        self, endpoint: str, channel: str, contract: str, cc_fn: str, args: typing.List
+    ) -> str:
+        req = {
+            "channel": channel,
+            "contract": contract,
+            "contractFunction": cc_fn,
+            "args": args,
+        }
+        res = self.session.post(f"{self.url}/transaction/{endpoint}", json=req)
+        return res.text
+
+    def invoke(self, channel: str, contract: str, cc_fn: str, args: typing.List):
+        return self.transaction("invoke", channel, contract, cc_fn, args)
+
+    def query(self, channel: str, contract: str, cc_fn: str, args: typing.List):
+        return self.transaction("query", channel, contract, cc_fn, args)
+
+    def query_many(
+        self,
+        channel: str,
+        contract: str,
+        cc_fn: str,
+        args_list: typing.Iterable[typing.List],
+    ) -> typing.List[str]:
+        """Run one query per args entry concurrently, results in the same order."""
+        return list(
+            self.executor.map(
+                lambda args: self.query(channel, contract, cc_fn, args), args_list
+            )
+        )
+
+    async def invoke_async(
+        self, channel: str, contract: str, cc_fn: str, args: typing.List
+    ):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.invoke, channel, contract, cc_fn, args
+        )
+
+    async def query_async(
+        self, channel: str, contract: str, cc_fn: str, args: typing.List
+    ):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.query, channel, contract, cc_fn, args
+        )
+
+    async def query_many_async(
+        self,
+        channel: str,
+        contract: str,
+        cc_fn: str,
+        args_list: typing.Iterable[typing.List],
+    ) -> typing.List[str]:
+        return await asyncio.gather(
+            *(self.query_async(channel, contract, cc_fn, args) for args in args_list)
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def chaincode_client(server="localhost", port=5000) -> ChaincodeClient:
+    return ChaincodeClient(server=server, port=port)
 
 
 def invoke_chaincode(
@@ -10,17 +94,7 @@ def invoke_chaincode(
     server="localhost",
     port=5000,
 ):
-    req = {
-        "channel": channel,
-        "contract": contract,
-        "contractFunction": cc_fn,
-        "args": args,
-    }
-    res = requests.post(
-        f"http://{server}:{port}/transaction/invoke",
-        json=req,
-    )
-    return res.text
+    return chaincode_client(server, port).invoke(channel, contract, cc_fn, args)
 
 
 def query_chaincode(
@@ -31,14 +105,50 @@ def query_chaincode(
     server="localhost",
     port=5000,
 ):
-    req = {
-        "channel": channel,
-        "contract": contract,
-        "contractFunction": cc_fn,
-        "args": args,
-    }
-    res = requests.post(
-        f"http://{server}:{port}/transaction/query",
-        json=req,
+    return chaincode_client(server, port).query(channel, contract, cc_fn, args)
+
+
+def query_chaincode_many(
+    channel: str,
+    contract: str,
+    cc_fn: str,
+    args_list: typing.Iterable[typing.List],
+    server="localhost",
+    port=5000,
+):
+    return chaincode_client(server, port).query_many(
+        channel, contract, cc_fn, args_list
+    )
+
+
+def models_exist(
+    channel: str,
+    contract: str,
+    model_ids: typing.List[str],
+    server="localhost",
+    port=5000,
+    cc_fn="ModelsExist",
+) -> typing.List[bool]:
+    """Check many model IDs in a single chaincode query."""
+    res = query_chaincode(
+        channel, contract, cc_fn, [json.dumps(model_ids)], server, port
     )
-    return res.text
+
+    # A failed query endorses nothing
+    return json.loads(res) if res else [False] * len(model_ids)
+
+
+def read_models(
+    channel: str,
+    contract: str,
+    model_ids: typing.List[str],
+    server="localhost",
+    port=5000,
+    cc_fn="ReadModels",
+) -> typing.List[typing.Optional[typing.Dict]]:
+    """Read many models in a single chaincode query, None for missing models."""
+    res = query_chaincode(
+        channel, contract, cc_fn, [json.dumps(model_ids)], server, port
+    )
+
+    return json.loads(res) if res else [None] * len(model_ids)
@@ -1,7 +1,10 @@
+from typing import Callable, Optional
+
+import numpy as np
 import torch
 from opacus.privacy_engine import PrivacyEngine
 
-from ..utils import get_device
+from ..utils import get_device, set_parameters
 from ...utils.constants import (
     DEFAULT_LEARNING_RATE,
     DEFAULT_LOCAL_EPOCHS,
@@ -19,14 +22,13 @@ def train(
     momentum=DEFAULT_MOMENTUM,
     privacy_engine: PrivacyEngine = None,
     device=None,
+    on_epoch_end: Optional[Callable[[int, float], None]] = None,
 ):
     """Train the network on the training set."""
     if not device:
         device = get_device()
 
-    criterion = torch.nn.CrossEntropyLoss()
     optimizer = torch.optim.SGD(net.parameters(), lr=lr, momentum=momentum)
-    loss_vals = []
 
     # Must be in training mode prior to wrapping Opacus
     net.train()
@@ -40,7 +42,74 @@ def train(
             max_grad_norm=PRIVACY_MAX_GRAD_NORM,
         )
 
-    for _ in range(epochs):
+    loss_vals = _train_epochs(net, optimizer, trainloader, epochs, device, on_epoch_end)
+
+    # Cleanup hooks
+    if privacy_engine:
+        net.remove_hooks()
+
+    return loss_vals
+
+
+class PrivateSession:
+    """Differentially private training of one network, kept across rounds.
+
+    The network, optimizer and data loader are made private once, and reused by
+    every round, so the per-sample gradient hooks and Poisson sampled loader are
+    only built once, and the accountant records a single history of steps. The
+    private module shares its parameters with `net`, so new global weights can
+    be loaded into `net` in place between rounds.
+    """
+
+    def __init__(
+        self,
+        net,
+        trainloader,
+        privacy_engine: PrivacyEngine,
+        lr=DEFAULT_LEARNING_RATE,
+        momentum=DEFAULT_MOMENTUM,
+        noise_multiplier=PRIVACY_NOISE_MULTIPLIER,
+        max_grad_norm=PRIVACY_MAX_GRAD_NORM,
+    ):
+        self.privacy_engine = privacy_engine
+
+        # Must be in training mode prior to wrapping Opacus
+        net.train()
+        self.net, self.optimizer, self.trainloader = privacy_engine.make_private(
+            module=net,
+            optimizer=torch.optim.SGD(net.parameters(), lr=lr, momentum=momentum),
+            data_loader=trainloader,
+            noise_multiplier=noise_multiplier,
+            max_grad_norm=max_grad_norm,
+        )
+
+    def train(
+        self,
+        epochs=DEFAULT_LOCAL_EPOCHS,
+        device=None,
+        on_epoch_end: Optional[Callable[[int, float], None]] = None,
+    ):
+        """Train the current weights of the network for a round."""
+        if not device:
+            device = get_device()
+
+        # Each round starts from new global weights, as with a new optimizer
+        self.optimizer.state.clear()
+        self.net.train()
+        loss_vals = _train_epochs(
+            self.net, self.optimizer, self.trainloader, epochs, device, on_epoch_end
+        )
+
+        # Free the per-sample gradients until the next round
+        self.optimizer.zero_grad(set_to_none=True)
+
+        return loss_vals
+
+
+def _train_epochs(net, optimizer, trainloader, epochs, device, on_epoch_end):
+    criterion = torch.nn.CrossEntropyLoss()
+    loss_vals = []
+    for epoch in range(epochs):
         epoch_loss = []
         for images, labels in trainloader:
             images, labels = images.to(device), labels.to(device)
@@ -52,10 +121,8 @@ def train(
             epoch_loss.append(loss.item())
 
         loss_vals.append(sum(epoch_loss) / len(epoch_loss))
-
-    # Cleanup hooks
-    if privacy_engine:
-        net.remove_hooks()
+        if on_epoch_end:
+            on_epoch_end(epoch, loss_vals[-1])
 
     return loss_vals
 
@@ -79,3 +146,68 @@ def test(net, testloader, device=None):
     loss /= len(testloader.dataset)
     accuracy = correct / total
     return loss, accuracy
+
+
+def _stack_candidates(net, candidates, device):
+    # Candidate weights follow the state dict order, as in set_parameters
+    state = net.state_dict()
+    return {
+        key: torch.from_numpy(np.stack([weights[idx] for weights in candidates])).to(
+            device=device, dtype=value.dtype
+        )
+        for idx, (key, value) in enumerate(state.items())
+    }
+
+
+def test_many(net, candidates, testloader, device=None):
+    """Validate several weight sets for `net` in a single pass over the test set.
+
+    The candidates are stacked and run as one vectorized model with torch.func,
+    falling back to validating them one at a time if the model cannot be vmapped.
+    `net` itself is left unchanged, unless the fallback is used.
+    """
+    if not device:
+        device = get_device()
+
+    net.eval()
+    stacked = _stack_candidates(net, candidates, device)
+    batched_net = torch.func.vmap(
+        lambda state, images: torch.func.functional_call(net, state, (images,)),
+        in_dims=(0, None),
+    )
+
+    num_models = len(candidates)
+    correct = torch.zeros(num_models, dtype=torch.long, device=device)
+    losses = torch.zeros(num_models, device=device)
+    total = 0
+    with torch.no_grad():
+        for images, labels in testloader:
+            images, labels = images.to(device), labels.to(device)
+            try:
+                outputs = batched_net(stacked, images)
+            except RuntimeError:
+                return _test_each(net, candidates, testloader, device)
+
+            # Mean loss per model and batch, as in `test`
+            losses += (
+                torch.nn.functional.cross_entropy(
+                    outputs.flatten(0, 1), labels.repeat(num_models), reduction="none"
+                )
+                .view(num_models, -1)
+                .mean(dim=1)
+            )
+            correct += (outputs.argmax(dim=2) == labels).sum(dim=1)
+            total += labels.size(0)
+
+    return [
+        (loss / len(testloader.dataset), num_correct / total)
+        for loss, num_correct in zip(losses.tolist(), correct.tolist())
+    ]
+
+
+def _test_each(net, candidates, testloader, device):
+    results = []
+    for weights in candidates:
+        set_parameters(net, weights)
+        results.append(test(net, testloader, device=device))
+    return results
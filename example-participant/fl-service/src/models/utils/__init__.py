@@ -2,3 +2,4 @@ from .checkpoint import *
 from .environment import *
 from .model import *
 from .serde import *
+from .store import *
@@ -1,18 +1,115 @@
 import os
-import pickle
+import json
+import struct
+import hashlib
+import tempfile
 
-from flwr.common import Parameters
+import numpy as np
+from flwr.common import (
+    Parameters,
+    Weights,
+    parameters_to_weights,
+    weights_to_parameters,
+)
 
+# Layout: magic, header length (u64), JSON header, then each layer's raw bytes
+# at an aligned offset. The header records each layer's dtype, shape and offset,
+# so weights can be memory mapped without any parsing, and a single SHA-256 of
+# all layer bytes, checked by `load_weights(verify=True)`.
+CHECKPOINT_MAGIC = b"SFLCKPT1"
+CHECKPOINT_ALIGNMENT = 64
 
-def save_model(parameters: Parameters, file="model/latest-weights.pkl"):
-    os.makedirs(os.path.dirname(file), exist_ok=True)
-    with open(file, "wb") as file:
-        pickle.dump(parameters, file)
 
+def _align(offset: int) -> int:
+    return -(-offset // CHECKPOINT_ALIGNMENT) * CHECKPOINT_ALIGNMENT
 
-def load_model(file="model/latest-weights.pkl") -> Parameters:
+
+def _layer_bytes(layer: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(layer).reshape(-1).view(np.uint8)
+
+
+def save_weights(weights: Weights, file="model/latest-weights.ckpt"):
+    digest = hashlib.sha256()
+    for layer in weights:
+        digest.update(_layer_bytes(layer))
+
+    layers = [
+        {"dtype": layer.dtype.str, "shape": list(layer.shape), "nbytes": layer.nbytes}
+        for layer in weights
+    ]
+    header = {"hash": digest.hexdigest(), "layers": layers}
+
+    # Offsets depend on the header size, so grow it until the layout is stable
+    header_size = 0
+    while True:
+        offset = _align(len(CHECKPOINT_MAGIC) + 8 + header_size)
+        for layer in layers:
+            layer["offset"] = offset
+            offset = _align(offset + layer["nbytes"])
+        header_bytes = json.dumps(header).encode()
+        if len(header_bytes) <= header_size:
+            break
+        header_size = len(header_bytes)
+    header_bytes = header_bytes.ljust(header_size)
+
+    # Write then rename, so readers never see a partial checkpoint
+    directory = os.path.dirname(file) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(CHECKPOINT_MAGIC)
+            f.write(struct.pack("<Q", header_size))
+            f.write(header_bytes)
+            for layer, info in zip(weights, layers):
+                f.seek(info["offset"])
+                f.write(_layer_bytes(layer))
+            f.truncate(offset)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # mkstemp files are private, keep the replaced checkpoint's mode instead
+        mode = os.stat(file).st_mode & 0o777 if os.path.exists(file) else 0o644
+        os.chmod(tmp_file, mode)
+        os.replace(tmp_file, file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def read_checkpoint_header(file="model/latest-weights.ckpt") -> dict:
+    with open(file, "rb") as f:
+        if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+            raise ValueError(f"{file} is not a model checkpoint")
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(header_size))
+
+
+def load_weights(file="model/latest-weights.ckpt", verify=False) -> Weights:
+    """Memory map a checkpoint's layers (read-only, no copies)."""
+    header = read_checkpoint_header(file)
+    buffer = np.memmap(file, dtype=np.uint8, mode="r")
+
+    weights = []
+    digest = hashlib.sha256()
+    for info in header["layers"]:
+        raw = buffer[info["offset"] : info["offset"] + info["nbytes"]]
+        if verify:
+            digest.update(raw)
+        weights.append(raw.view(np.dtype(info["dtype"])).reshape(info["shape"]))
+
+    if verify and digest.hexdigest() != header["hash"]:
+        raise ValueError(f"{file} does not match its content hash")
+
+    return weights
+
+
+def save_model(parameters: Parameters, file="model/latest-weights.ckpt"):
+    save_weights(parameters_to_weights(parameters), file=file)
+
+
+def load_model(file="model/latest-weights.ckpt") -> Parameters:
     try:
-        with open(file, "rb") as file:
-            return pickle.load(file)
+        return weights_to_parameters(load_weights(file))
     except IOError:
         return None
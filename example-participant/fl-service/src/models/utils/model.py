@@ -1,19 +1,13 @@
-import hashlib
 from dataclasses import dataclass
-from collections import OrderedDict
 
+import numpy as np
 import torch
-import pandas as pd
 from flwr.client.numpy_client import NumPyClientWrapper
-from flwr.common import ParametersRes
-
-from .serde import serialize_model_params_res
 
 
 @dataclass
 class ModelCheckpointInfo:
     model_hash: str = ""
-    serialized_model: str = ""
     last_acc: int = 0
     highest_acc: int = 0
     parameter_count: int = 0
@@ -21,17 +15,34 @@ class ModelCheckpointInfo:
 
 
 def get_parameters(model):
-    return [val.cpu().numpy() for _, val in model.state_dict().items()]
+    """Model state as numpy arrays, views of the tensors when they are on the CPU."""
+    return [val.detach().cpu().numpy() for val in model.state_dict().values()]
 
 
 def set_parameters(model, parameters):
-    params_dict = zip(model.state_dict().keys(), parameters)
-    state_dict = OrderedDict({k: torch.Tensor(v) for k, v in params_dict})
-    model.load_state_dict(state_dict, strict=True)
+    """Copy weights in place into the model's tensors, keeping their dtypes."""
+    state_dict = model.state_dict()
+    if len(parameters) != len(state_dict):
+        raise ValueError(
+            f"Got {len(parameters)} parameters, model has {len(state_dict)}"
+        )
+
+    with torch.no_grad():
+        for (key, tensor), value in zip(state_dict.items(), parameters):
+            value = torch.from_numpy(np.asarray(value))
+            if value.shape != tensor.shape:
+                raise ValueError(
+                    f"Parameter {key} has shape {tuple(value.shape)}, "
+                    f"model has {tuple(tensor.shape)}"
+                )
+            tensor.copy_(value)
 
 
 def count_parameters(model, breakdown=False, trainable=False):
     if breakdown:
+        # Only needed for the breakdown, pandas is slow to import
+        import pandas as pd
+
         df_parameters = pd.DataFrame(
             [
                 [name, p.numel()]
@@ -47,21 +58,13 @@ def count_parameters(model, breakdown=False, trainable=False):
         )
 
 
-def model_info(parameters_res: ParametersRes):
-    serialized_model = serialize_model_params_res(parameters_res)
-
-    return {
-        "model_hash": hashlib.sha256(serialized_model).hexdigest(),
-        "serialized_model": serialized_model.hex(),
-    }
-
-
 def client_model_info(client: NumPyClientWrapper):
-    parameters_res = client.get_parameters()
+    """Info of the client's last committed model, never waits on training."""
+    checkpoint_info = client.numpy_client.committed_info
     return {
-        **model_info(parameters_res),
-        "last_acc": client.numpy_client.checkpoint_info.last_acc,
-        "highest_acc": client.numpy_client.checkpoint_info.highest_acc,
-        "parameter_count": client.numpy_client.checkpoint_info.parameter_count,
-        "epsilon": client.numpy_client.checkpoint_info.epsilon,
+        "model_hash": checkpoint_info.model_hash,
+        "last_acc": checkpoint_info.last_acc,
+        "highest_acc": checkpoint_info.highest_acc,
+        "parameter_count": checkpoint_info.parameter_count,
+        "epsilon": checkpoint_info.epsilon,
     }
@@ -4,7 +4,7 @@ from flwr.proto.transport_pb2 import ClientMessage
 
 def serialize_model_params_res(parameters_res: ParametersRes):
     parameters_res_proto = serde.parameters_res_to_proto(parameters_res)
-    serialized_model = parameters_res_proto.SerializeToString(True)
+    serialized_model = parameters_res_proto.SerializeToString(deterministic=True)
 
     return serialized_model
 
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+from dataclasses import dataclass
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from flwr.common import Parameters, ParametersRes, Weights, weights_to_parameters
+
+from .serde import serialize_model_params_res
+from ...utils.constants import MODEL_STORE_MAX_BYTES, MODEL_STORE_MAX_ENTRIES
+from ...utils.profiling import profiler
+
+
+@dataclass
+class ModelEntry:
+    model_hash: str
+    serialized_model: bytes
+    weights: Weights
+    # Kept so fit results are sent without serializing the weights again
+    parameters: Parameters
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            len(self.serialized_model)
+            + sum(w.nbytes for w in self.weights)
+            + sum(len(t) for t in self.parameters.tensors)
+        )
+
+
+def hash_model(serialized_model: bytes) -> str:
+    return hashlib.sha256(serialized_model).hexdigest()
+
+
+class ModelStore:
+    """Content-addressed LRU store of model checkpoints, keyed by model hash."""
+
+    def __init__(
+        self,
+        max_entries: int = MODEL_STORE_MAX_ENTRIES,
+        max_bytes: int = MODEL_STORE_MAX_BYTES,
+    ):
+        self.max_entries = max(max_entries, 1)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self._entries: "OrderedDict[str, ModelEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, model_hash: str):
+        return model_hash in self._entries
+
+    def get(self, model_hash: str) -> Optional[ModelEntry]:
+        with self._lock:
+            entry = self._entries.get(model_hash)
+            if entry:
+                self._entries.move_to_end(model_hash)
+            return entry
+
+    def find(self, weights: Weights) -> Optional[ModelEntry]:
+        """Find the entry holding this exact weights list (by identity, not value)."""
+        with self._lock:
+            return next(
+                (e for e in self._entries.values() if e.weights is weights), None
+            )
+
+    def put(self, weights: Weights) -> ModelEntry:
+        """Serialize and hash weights, storing a private copy if the model is new."""
+        # Weights handed out by the store are already serialized
+        entry = self.find(weights)
+        if entry:
+            return entry
+
+        with profiler.span("store.serialize"):
+            parameters = weights_to_parameters(weights)
+            serialized_model = serialize_model_params_res(
+                ParametersRes(parameters=parameters)
+            )
+        with profiler.span("store.hash"):
+            model_hash = hash_model(serialized_model)
+
+        with self._lock:
+            entry = self._entries.get(model_hash)
+            if entry:
+                self._entries.move_to_end(model_hash)
+                return entry
+
+            # Weights may be views into live model storage, keep our own copy
+            entry = ModelEntry(
+                model_hash=model_hash,
+                serialized_model=serialized_model,
+                weights=[np.array(w, copy=True) for w in weights],
+                parameters=parameters,
+            )
+            self._entries[model_hash] = entry
+            self.nbytes += entry.nbytes
+            self._evict()
+
+            return entry
+
+    def _evict(self):
+        # Always keep the most recent entry, even if it is over the byte bound
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
@@ -0,0 +1,5 @@
+from .clients import *
+from .orchestrator import *
+from .probes import *
+from .shard_server import *
+from .supervisor import *
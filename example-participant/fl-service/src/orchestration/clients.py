@@ -0,0 +1,93 @@
+import os
+import subprocess
+from typing import Any
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from ..utils.constants import WORKER_LOG_DIR
+
+
+@dataclass
+class ClientInfo:
+    shard_id: int
+    client_id: int
+    server_port: int = 8080
+    app_server: str = "http://localhost"
+    fabric_server: str = "http://localhost"
+    app_process: Any = None
+    fabric_process: Any = None
+
+    _app_starting_port = 3000
+    _fabric_starting_port = 5000
+
+    @property
+    def app_port(self):
+        return self.shard_id + ClientInfo._app_starting_port
+
+    @property
+    def fabric_port(self):
+        return self.shard_id + ClientInfo._fabric_starting_port
+
+    @property
+    def app_url(self):
+        return f"{self.app_server}:{self.app_port}"
+
+    @property
+    def fabric_url(self):
+        return f"{self.fabric_server}:{self.fabric_port}"
+
+
+@contextmanager
+def worker_output(name: str, verbose: bool = False, log_dir: str = WORKER_LOG_DIR):
+    """Popen arguments sending a worker's output to the console, or its log file."""
+    if verbose:
+        yield {}
+        return
+
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, f"{name}.log"), "ab") as log_file:
+        yield {"stdout": log_file, "stderr": subprocess.STDOUT}
+
+
+def create_fl_client(
+    client_info: ClientInfo,
+    num_clients: int = 0,
+    use_gpu: bool = True,
+    num_threads: bool = 0,
+    use_dp: bool = True,
+    verbose: bool = False,
+    log_dir: str = WORKER_LOG_DIR,
+):
+    env_vars = os.environ.copy()
+    env_vars["PORT"] = str(client_info.app_port)
+    env_vars["SERVER_PORT"] = str(client_info.server_port)
+    env_vars["CLIENT_USE_GPU"] = str(use_gpu)
+    env_vars["CLIENT_NUM_THREADS"] = str(num_threads)
+    env_vars["CLIENT_USE_DIFFERENTIAL_PRIVACY"] = str(use_dp)
+    env_vars["FABRIC_CHANNEL"] = f"shard{client_info.shard_id}"
+    env_vars["CHAINCODE_CONTRACT"] = f"models{client_info.shard_id}"
+    env_vars["TEST_SIMULATE_CLIENT_ID"] = str(client_info.client_id)
+    env_vars["TEST_SIMULATE_CLIENTS_COUNT"] = str(num_clients)
+
+    with worker_output(f"app-{client_info.client_id}", verbose, log_dir) as output:
+        app_client = subprocess.Popen(["python", "app.py"], env=env_vars, **output)
+
+    return app_client
+
+
+def create_fabric_client(
+    client_info: ClientInfo, verbose: bool = False, log_dir: str = WORKER_LOG_DIR
+):
+    env_vars = os.environ.copy()
+    env_vars["PORT"] = str(client_info.fabric_port)
+    env_vars["SHARD_ID"] = str(client_info.shard_id)
+
+    with worker_output(f"fabric-{client_info.shard_id}", verbose, log_dir) as output:
+        fabric_client = subprocess.Popen(
+            ["npm", "run", "start"],
+            env=env_vars,
+            cwd=os.path.join(os.getcwd(), "../fabric-sdk"),
+            **output,
+        )
+
+    return fabric_client
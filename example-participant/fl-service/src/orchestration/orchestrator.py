@@ -0,0 +1,128 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+from .clients import ClientInfo
+from .probes import wait_for_http
+from .shard_server import ShardServer
+from ..server import server_pipeline
+from ..utils.constants import JOB_POLL_INTERVAL, READY_TIMEOUT
+
+
+class RoundOrchestrator:
+    """Run FL rounds back to back, without interaction.
+
+    Readiness is probed rather than slept on. A single shard server is started
+    on the first round and kept for every round after it, so the strategy, its
+    eval data and the client connections are only set up once.
+    """
+
+    def __init__(
+        self,
+        clients: List[ClientInfo],
+        num_clients: int = 0,
+        server_port: int = 8080,
+        model_path: str = "model/latest-weights.ckpt",
+        poll_interval: float = JOB_POLL_INTERVAL,
+        ready_timeout: float = READY_TIMEOUT,
+    ):
+        self.clients = clients
+        self.num_clients = num_clients or len(clients)
+        self.server_port = server_port
+        self.model_path = model_path
+        self.poll_interval = poll_interval
+        self.ready_timeout = ready_timeout
+        self.shard_server: ShardServer = None
+
+        self.session = requests.Session()
+        self.pool = ThreadPoolExecutor(
+            len(clients) + 4, thread_name_prefix="orchestrator"
+        )
+
+    def wait_ready(self):
+        """Wait for every client's app to be healthy."""
+        for client in self.clients:
+            wait_for_http(f"{client.app_url}/health", timeout=self.ready_timeout)
+
+    def ensure_server(self) -> ShardServer:
+        if not self.shard_server:
+            strategy, _ = server_pipeline(
+                num_clients=self.num_clients,
+                save_model_path=self.model_path,
+                load_model_path=self.model_path,
+            )
+            self.shard_server = ShardServer(
+                strategy, server_address=f"localhost:{self.server_port}"
+            ).start()
+
+        return self.shard_server
+
+    def close(self):
+        if self.shard_server:
+            self.shard_server.stop()
+            self.shard_server = None
+
+    def start_jobs(self, rnd: int) -> Dict[int, str]:
+        """Queue a round on every client, returning job ids by client index."""
+
+        def start_job(client: ClientInfo) -> str:
+            res = self.session.get(
+                f"{client.app_url}/round/start",
+                params={"round": rnd, "server_port": self.server_port},
+            )
+            res.raise_for_status()
+            return res.json()["job_id"]
+
+        job_ids = self.pool.map(start_job, self.clients)
+        return dict(enumerate(job_ids))
+
+    def wait_jobs(self, rnd: int, job_ids: Dict[int, str]) -> Dict[int, dict]:
+        """Poll client jobs until all of them are done."""
+        jobs, pending = {}, dict(job_ids)
+        while pending:
+            for idx, job_id in list(pending.items()):
+                job = self.session.get(
+                    f"{self.clients[idx].app_url}/round/jobs/{job_id}"
+                ).json()
+                if job["status"] not in ("succeeded", "failed"):
+                    continue
+
+                if job["status"] == "succeeded":
+                    print(
+                        f"Round {rnd} FL Client {idx}: acc {job['result']['last_acc']}"
+                    )
+                else:
+                    print(f"Round {rnd} FL Client {idx}: failed {job['error']}")
+                del pending[idx]
+                jobs[idx] = job
+
+            if pending:
+                time.sleep(self.poll_interval)
+
+        return jobs
+
+    def run(self, num_rounds: int, first_round: int = 1) -> List[Dict[int, dict]]:
+        """Run `num_rounds` rounds, returning each round's client jobs."""
+        shard_server = self.ensure_server()
+        reports: List[Future] = []
+
+        for rnd in range(first_round, first_round + num_rounds):
+            start = time.perf_counter()
+
+            print(f"Starting FL round: {rnd}")
+            job_ids = self.start_jobs(rnd)
+            result = shard_server.fit_round(rnd)
+            reports.append(self.pool.submit(self.wait_jobs, rnd, job_ids))
+
+            # Later rounds would start from a stale model, stop here
+            if not result["aggregated"]:
+                print(f"Round {rnd} failed to aggregate")
+                break
+            print(
+                f"Round {rnd} aggregated in {time.perf_counter() - start:.2f}s: "
+                f"{result['metrics']}"
+            )
+
+        return [report.result() for report in reports]
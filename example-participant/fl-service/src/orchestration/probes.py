@@ -0,0 +1,61 @@
+import time
+import socket
+
+import requests
+
+from ..utils.constants import READY_POLL_INTERVAL, READY_TIMEOUT
+
+
+def probe_port(port: int, host: str = "localhost", timeout: float = 1) -> bool:
+    """Whether something accepts connections on host:port."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def probe_http(url: str, timeout: float = 1) -> bool:
+    """Whether `url` answers with a success status."""
+    try:
+        return requests.get(url, timeout=timeout).ok
+    except requests.RequestException:
+        return False
+
+
+def wait_for_port(
+    port: int,
+    host: str = "localhost",
+    timeout: float = READY_TIMEOUT,
+    interval: float = READY_POLL_INTERVAL,
+):
+    """Block until something accepts connections on host:port."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=interval):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{host}:{port} not ready after {timeout}s")
+            time.sleep(interval)
+
+
+def wait_for_http(
+    url: str,
+    timeout: float = READY_TIMEOUT,
+    interval: float = READY_POLL_INTERVAL,
+) -> requests.Response:
+    """Block until `url` answers without a server error."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            res = requests.get(url, timeout=max(interval, 1))
+            if res.status_code < 500:
+                return res
+        except requests.RequestException:
+            pass
+
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} not ready after {timeout}s")
+        time.sleep(interval)
@@ -0,0 +1,86 @@
+import threading
+from logging import INFO
+from typing import Optional
+
+from flwr.common import GRPC_MAX_MESSAGE_LENGTH
+from flwr.common.logger import log
+from flwr.server.client_manager import SimpleClientManager
+from flwr.server.grpc_server.grpc_server import start_insecure_grpc_server
+from flwr.server.history import History
+from flwr.server.server import Server
+from flwr.server.strategy import Strategy
+
+
+class ShardServer:
+    """A flower server kept up across rounds.
+
+    The strategy (with its eval model and test set), the gRPC server and the
+    client connections are set up once. Each `fit_round` call runs one round
+    on the connected clients, starting from the last aggregated model.
+    """
+
+    def __init__(
+        self,
+        strategy: Strategy,
+        server_address: str = "[::]:8080",
+        grpc_max_message_length: int = GRPC_MAX_MESSAGE_LENGTH,
+    ):
+        self.server = Server(client_manager=SimpleClientManager(), strategy=strategy)
+        self.server_address = server_address
+        self.grpc_max_message_length = grpc_max_message_length
+        self.history = History()
+        self.round = 0
+
+        self._grpc_server = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def start(self) -> "ShardServer":
+        self._grpc_server = start_insecure_grpc_server(
+            client_manager=self.server.client_manager(),
+            server_address=self.server_address,
+            max_message_length=self.grpc_max_message_length,
+        )
+        log(INFO, "Flower shard server running (insecure) on %s", self.server_address)
+
+        return self
+
+    def fit_round(self, rnd: Optional[int] = None) -> dict:
+        """Run a round, blocking until it is aggregated and evaluated."""
+        with self._lock:
+            if not self._initialized:
+                # From the strategy, or from a connected client
+                self.server.parameters = self.server._get_initial_parameters()
+                self._initialized = True
+
+            self.round = rnd or self.round + 1
+            res_fit = self.server.fit_round(rnd=self.round)
+            aggregated = bool(res_fit and res_fit[0])
+            if aggregated:
+                self.server.parameters = res_fit[0]
+
+            loss, metrics = None, {}
+            res_cen = self.server.strategy.evaluate(parameters=self.server.parameters)
+            if res_cen is not None:
+                loss, metrics = res_cen
+                log(INFO, "round %s: %s, %s", self.round, loss, metrics)
+                self.history.add_loss_centralized(rnd=self.round, loss=loss)
+                self.history.add_metrics_centralized(rnd=self.round, metrics=metrics)
+
+            res_fed = self.server.evaluate_round(rnd=self.round)
+            if res_fed and res_fed[0]:
+                self.history.add_loss_distributed(rnd=self.round, loss=res_fed[0])
+                self.history.add_metrics_distributed(rnd=self.round, metrics=res_fed[1])
+
+            return {
+                "round": self.round,
+                "aggregated": aggregated,
+                "loss": loss,
+                "metrics": metrics,
+            }
+
+    def stop(self):
+        if self._grpc_server:
+            self.server.disconnect_all_clients()
+            self._grpc_server.stop(grace=1)
+            self._grpc_server = None
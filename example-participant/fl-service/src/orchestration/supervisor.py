@@ -0,0 +1,157 @@
+import time
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+from .probes import probe_http, probe_port
+from ..utils.constants import (
+    READY_POLL_INTERVAL,
+    READY_TIMEOUT,
+    RESTART_BACKOFF,
+    RESTART_BACKOFF_MAX,
+    SUPERVISOR_POLL_INTERVAL,
+)
+
+
+@dataclass
+class Worker:
+    name: str
+    launch: Callable[[], subprocess.Popen]
+    health_url: Optional[str] = None
+    port: Optional[int] = None
+    process: Any = None
+    probe: Future = None
+    started: float = 0.0
+    ready: bool = False
+    startup_latency: Optional[float] = None
+    restarts: int = 0
+    backoff: float = RESTART_BACKOFF
+    restart_at: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "ready": self.ready,
+            "startup_latency": self.startup_latency,
+            "restarts": self.restarts,
+        }
+
+
+class Supervisor:
+    """Launch worker processes, probe them until ready, and restart the ones that exit.
+
+    Restarts back off exponentially from `backoff` to `max_backoff` seconds, the
+    backoff is reset once a worker has been up for `max_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        backoff: float = RESTART_BACKOFF,
+        max_backoff: float = RESTART_BACKOFF_MAX,
+        poll_interval: float = SUPERVISOR_POLL_INTERVAL,
+        ready_timeout: float = READY_TIMEOUT,
+        probe_workers: int = 32,
+    ):
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.ready_timeout = ready_timeout
+        self.workers: List[Worker] = []
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._probes = ThreadPoolExecutor(
+            probe_workers, thread_name_prefix="supervisor-probe"
+        )
+
+        threading.Thread(target=self._monitor, name="supervisor", daemon=True).start()
+
+    def launch(
+        self,
+        name: str,
+        launch: Callable[[], subprocess.Popen],
+        health_url: Optional[str] = None,
+        port: Optional[int] = None,
+    ) -> Worker:
+        """Start a worker, ready once `health_url` answers or `port` accepts."""
+        worker = Worker(name, launch, health_url, port, backoff=self.backoff)
+        with self._lock:
+            self._start(worker)
+            self.workers.append(worker)
+
+        return worker
+
+    def wait_ready(self, workers: Iterable[Worker] = None) -> bool:
+        """Wait for the workers' probes, True if all of them became ready."""
+        workers = list(self.workers if workers is None else workers)
+        wait([worker.probe for worker in workers])
+
+        return all(worker.ready for worker in workers)
+
+    def report(self) -> List[dict]:
+        return [worker.to_dict() for worker in self.workers]
+
+    def stop(self, timeout: float = 10):
+        with self._lock:
+            self._stopped.set()
+            for worker in self.workers:
+                if worker.alive:
+                    worker.process.terminate()
+
+        for worker in self.workers:
+            try:
+                worker.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+    def _start(self, worker: Worker):
+        worker.ready, worker.restart_at = False, None
+        worker.started = time.monotonic()
+        worker.process = worker.launch()
+        worker.probe = self._probes.submit(self._probe, worker, worker.process)
+
+    def _probe(self, worker: Worker, process: subprocess.Popen):
+        deadline = worker.started + self.ready_timeout
+        while process.poll() is None and time.monotonic() < deadline:
+            if (worker.health_url and probe_http(worker.health_url)) or (
+                worker.port and probe_port(worker.port)
+            ):
+                worker.ready = process is worker.process
+                worker.startup_latency = time.monotonic() - worker.started
+                print(f"{worker.name} ready in {worker.startup_latency:.2f}s")
+                return
+            time.sleep(READY_POLL_INTERVAL)
+
+        if process.poll() is None:
+            print(f"{worker.name} not ready after {self.ready_timeout}s")
+
+    def _monitor(self):
+        while not self._stopped.wait(self.poll_interval):
+            now = time.monotonic()
+            with self._lock:
+                if self._stopped.is_set():
+                    return
+
+                for worker in self.workers:
+                    if worker.alive:
+                        # Reset the backoff of workers that stayed up
+                        if worker.ready and now - worker.started > self.max_backoff:
+                            worker.backoff = self.backoff
+                    elif worker.restart_at is None:
+                        worker.restart_at = now + worker.backoff
+                        print(
+                            f"{worker.name} exited with {worker.process.returncode}, "
+                            f"restarting in {worker.backoff:.1f}s"
+                        )
+                    elif now >= worker.restart_at:
+                        worker.restarts += 1
+                        worker.backoff = min(worker.backoff * 2, self.max_backoff)
+                        self._start(worker)
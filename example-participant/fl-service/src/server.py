@@ -1,15 +1,16 @@
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import flwr as fl
+from flwr.common import Parameters
 
 from .strategies import CommitteeStrategy
-from .models.utils import set_parameters, load_model
+from .models.utils import load_model
 from .datasets import cifar10_test, mnist_test
 from .models.simple_cnn import create_model
-from .models.evaluation.train_cls import test
+from .models.evaluation.train_cls import test_many
 
 
-def get_eval_fn():
-    """Return an evaluation function for server-side evaluation."""
+def get_eval_many_fn():
+    """Return a server-side evaluation function scoring several models in one pass."""
 
     # Load model
     # net = create_model(in_channels=3, dim_out=10, img_size=32)
@@ -19,12 +20,24 @@ def get_eval_fn():
     # Use the last 5k training examples as a validation set
     testloader = mnist_test()
 
+    def evaluate_many(
+        candidates: List[fl.common.Weights],
+    ) -> List[Tuple[float, Dict[str, float]]]:
+        return [
+            (loss, {"accuracy": accuracy})
+            for loss, accuracy in test_many(net, candidates, testloader)
+        ]
+
+    return evaluate_many
+
+
+def get_eval_fn():
+    """Return an evaluation function for server-side evaluation."""
+    evaluate_many = get_eval_many_fn()
+
     # The `evaluate` function will be called after every round
     def evaluate(weights: fl.common.Weights) -> Optional[Tuple[float, float]]:
-        set_parameters(net, weights)  # Update model with the latest parameters
-        loss, accuracy = test(net, testloader)
-
-        return loss, {"accuracy": accuracy}
+        return evaluate_many([weights])[0]
 
     return evaluate
 
@@ -33,12 +46,15 @@ def server_pipeline(
     config: Dict[str, int] = {},
     num_clients: int = 0,
     server_defence: bool = False,
-    save_model_path: str = "model/latest-weights.pkl",
-    load_model_path: str = "model/latest-weights.pkl",
+    save_model_path: str = "model/latest-weights.ckpt",
+    load_model_path: str = "model/latest-weights.ckpt",
+    parameters: Optional[Parameters] = None,
+    on_aggregate: Optional[Callable[[int, Parameters, int], None]] = None,
 ):
     """Create strategy, start Flower server."""
 
-    parameters = load_model(file=load_model_path)
+    if parameters is None:
+        parameters = load_model(file=load_model_path)
 
     # Define strategy
     strategy = CommitteeStrategy(
@@ -53,6 +69,7 @@ def server_pipeline(
         save_model_path=save_model_path,
         client_port=5000,
         fabric_channel="shard0",
+        on_aggregate=on_aggregate,
     )
 
     # Start client
@@ -0,0 +1,113 @@
+import os
+import time
+import multiprocessing
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional
+
+import flwr as fl
+from flwr.common import Parameters
+
+from .client import client_pipeline
+from .server import server_pipeline
+
+
+@dataclass
+class ShardResult:
+    shard_id: int
+    version: int
+    parameters: Optional[Parameters]
+    num_examples: int
+    elapsed: float
+
+
+def simulate_shard(
+    shard_id: int,
+    version: int,
+    parameters: Optional[Parameters],
+    num_clients: int,
+    num_cpus: int,
+) -> ShardResult:
+    """Train one shard for a round, from global `version`, in its own Ray instance."""
+    start = time.perf_counter()
+    aggregated = {}
+
+    def on_aggregate(_, parameters, num_examples):
+        aggregated.update(parameters=parameters, num_examples=num_examples)
+
+    strategy, config = server_pipeline(
+        config={"num_rounds": 1},
+        num_clients=num_clients,
+        server_defence=True,
+        save_model_path=None,
+        parameters=parameters,
+        on_aggregate=on_aggregate,
+    )
+
+    fl.simulation.start_simulation(
+        client_fn=lambda cid: client_pipeline(
+            client_id=int(cid), num_clients=num_clients, lock_inference=False
+        ),
+        num_clients=num_clients,
+        client_resources={"num_cpus": 1},
+        **config,
+        strategy=strategy,
+        ray_init_args={
+            "ignore_reinit_error": True,
+            "include_dashboard": False,
+            "num_cpus": num_cpus,
+        },
+    )
+
+    return ShardResult(
+        shard_id=shard_id,
+        version=version,
+        parameters=aggregated.get("parameters"),
+        num_examples=aggregated.get("num_examples", 0),
+        elapsed=time.perf_counter() - start,
+    )
+
+
+class ParallelShardExecutor:
+    """Train independent shards at the same time, one process per shard.
+
+    Each shard gets `cpus_per_shard` CPUs for its Ray clients, by default an even
+    split of the machine.
+    """
+
+    def __init__(
+        self,
+        num_shards: int,
+        num_clients: int,
+        cpus_per_shard: int = 0,
+        max_workers: int = 0,
+    ):
+        self.num_clients = num_clients
+        self.cpus_per_shard = cpus_per_shard or max(
+            (os.cpu_count() or 1) // max(num_shards, 1), 1
+        )
+        self.pool = ProcessPoolExecutor(
+            max_workers=max_workers or max(num_shards, 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def submit(
+        self, shard_id: int, version: int, parameters: Optional[Parameters]
+    ) -> "Future[ShardResult]":
+        return self.pool.submit(
+            simulate_shard,
+            shard_id,
+            version,
+            parameters,
+            self.num_clients,
+            self.cpus_per_shard,
+        )
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.shutdown()
@@ -1 +1,3 @@
+from .aggregation import *
 from .committee_strategy import *
+from .global_aggregator import *
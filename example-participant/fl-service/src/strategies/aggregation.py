@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+import numpy as np
+from flwr.common import FitRes, Parameters, Weights, bytes_to_ndarray
+
+from ..utils.constants import AGGREGATION_CHUNK_SIZE, AGGREGATION_THREADS
+
+
+class WeightedAccumulator:
+    """Streaming weighted average of model weights.
+
+    Each update is folded into a preallocated buffer per layer as it arrives, so
+    peak memory is one model plus one layer, rather than every client's weights.
+    Layers larger than `chunk_size` elements are reduced in chunks, split across
+    `num_threads` threads.
+    """
+
+    def __init__(
+        self,
+        dtype=np.float64,
+        chunk_size: int = AGGREGATION_CHUNK_SIZE,
+        num_threads: int = AGGREGATION_THREADS,
+    ):
+        self.dtype = dtype
+        self.chunk_size = max(chunk_size, 1)
+        self.num_threads = max(num_threads, 1)
+        self.num_examples = 0
+        self.num_updates = 0
+
+        self._buffers: Optional[List[np.ndarray]] = None
+        self._layer_dtypes: List[np.dtype] = []
+        self._executor = None
+
+    def add(self, layers: Iterable[np.ndarray], num_examples: int):
+        """Fold in one update, layers may be a generator to stream them."""
+        first_update = self._buffers is None
+        if first_update:
+            self._buffers = []
+
+        num_layers = 0
+        for idx, layer in enumerate(layers):
+            if first_update:
+                self._buffers.append(np.zeros(layer.shape, dtype=self.dtype))
+                self._layer_dtypes.append(layer.dtype)
+            elif idx >= len(self._buffers) or layer.shape != self._buffers[idx].shape:
+                raise ValueError(f"Update layer {idx} does not match the model")
+
+            self._fold(self._buffers[idx], layer, num_examples)
+            num_layers += 1
+
+        if num_layers != len(self._buffers):
+            raise ValueError("Update does not have the same number of layers")
+
+        self.num_examples += num_examples
+        self.num_updates += 1
+
+    def add_parameters(self, parameters: Parameters, num_examples: int):
+        self.add((bytes_to_ndarray(t) for t in parameters.tensors), num_examples)
+
+    def add_fit_res(self, fit_res: FitRes):
+        self.add_parameters(fit_res.parameters, fit_res.num_examples)
+
+    def finalize(self) -> Optional[Weights]:
+        """Weighted average of everything folded in, in the original layer dtypes."""
+        if not self._buffers or not self.num_examples:
+            return None
+
+        weights = []
+        for buffer, dtype in zip(self._buffers, self._layer_dtypes):
+            buffer /= self.num_examples
+            weights.append(buffer.astype(dtype, copy=False))
+
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        self._buffers = None
+
+        return weights
+
+    def _fold(self, buffer: np.ndarray, layer: np.ndarray, weight: float):
+        flat_buffer, flat_layer = buffer.reshape(-1), layer.reshape(-1)
+        if flat_buffer.size <= self.chunk_size:
+            flat_buffer += flat_layer * weight
+            return
+
+        def fold_chunk(start):
+            end = start + self.chunk_size
+            flat_buffer[start:end] += flat_layer[start:end] * weight
+
+        starts = range(0, flat_buffer.size, self.chunk_size)
+        if self.num_threads == 1:
+            for start in starts:
+                fold_chunk(start)
+            return
+
+        if not self._executor:
+            self._executor = ThreadPoolExecutor(
+                self.num_threads, thread_name_prefix="aggregate"
+            )
+        list(self._executor.map(fold_chunk, starts))
@@ -1,18 +1,18 @@
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 from flwr.common import (
     EvaluateRes,
     FitRes,
     Parameters,
-    parameters_to_weights,
     weights_to_parameters,
 )
-from flwr.server.strategy.aggregate import aggregate
 from flwr.server.client_manager import ClientManager
 from flwr.server.client_proxy import ClientProxy
 from flwr.server.strategy import FedAvg
 
-from ..models.utils import save_model, model_info
-from ..fabric.chaincode import query_chaincode
+from ..models.utils import save_model, hash_model, serialize_model_params_res
+from ..fabric.chaincode import models_exist
+from ..utils.profiling import profiler
+from .aggregation import WeightedAccumulator
 
 
 class CommitteeStrategy(FedAvg):
@@ -20,11 +20,12 @@ class CommitteeStrategy(FedAvg):
         self,
         *args,
         server_defence: bool = False,
-        save_model_path: str = "model/latest-weights.pkl",
+        save_model_path: str = "model/latest-weights.ckpt",
         client_port: int = 5000,
         fabric_channel: str = "shard0",
         chaincode_contract: str = "models0",
-        chaincode_model_exists_fn: str = "ModelExists",
+        chaincode_models_exist_fn: str = "ModelsExist",
+        on_aggregate: Optional[Callable[[int, Parameters, int], None]] = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -33,7 +34,8 @@ class CommitteeStrategy(FedAvg):
         self.client_port = client_port
         self.fabric_channel = fabric_channel
         self.chaincode_contract = chaincode_contract
-        self.chaincode_model_exists_fn = chaincode_model_exists_fn
+        self.chaincode_models_exist_fn = chaincode_models_exist_fn
+        self.on_aggregate = on_aggregate
 
     def configure_fit(
         self, rnd: int, parameters: Parameters, client_manager: ClientManager
@@ -52,32 +54,39 @@ class CommitteeStrategy(FedAvg):
             return None, {}
         # Convert results (only if clients have already endorsed updates)
         if not self.server_defence:
-            endorsed_results = list(
-                filter(
-                    lambda result: query_chaincode(
-                        self.fabric_channel,
-                        self.chaincode_contract,
-                        self.chaincode_model_exists_fn,
-                        [f"model_{model_info(result[1])['model_hash']}"],
-                        port=self.client_port,
-                    ),
-                    results,
+            with profiler.span("aggregate.models_exist", results=len(results)):
+                exists = models_exist(
+                    self.fabric_channel,
+                    self.chaincode_contract,
+                    [
+                        f"model_{hash_model(serialize_model_params_res(fit_res))}"
+                        for _, fit_res in results
+                    ],
+                    port=self.client_port,
+                    cc_fn=self.chaincode_models_exist_fn,
                 )
-            )
+            endorsed_results = [
+                result for result, model_exists in zip(results, exists) if model_exists
+            ]
         else:
             endorsed_results = results
         if not endorsed_results:
             return None, {}
-        weights_results = [
-            (parameters_to_weights(fit_res.parameters), fit_res.num_examples)
-            for _, fit_res in endorsed_results
-        ]
-        parameters = weights_to_parameters(aggregate(weights_results))
+        with profiler.span("aggregate.accumulate", results=len(endorsed_results)):
+            accumulator = WeightedAccumulator()
+            for _, fit_res in endorsed_results:
+                accumulator.add_fit_res(fit_res)
+            parameters = weights_to_parameters(accumulator.finalize())
 
         # Save aggregated_weights
         if parameters and self.save_model_path:
             print(f"Saving round {rnd} parameters...")
-            save_model(parameters, file=self.save_model_path)
+            with profiler.span("aggregate.save_model"):
+                save_model(parameters, file=self.save_model_path)
+
+        # Push aggregated weights, and the examples they represent, to the next level
+        if parameters and self.on_aggregate:
+            self.on_aggregate(rnd, parameters, accumulator.num_examples)
 
         return parameters, {}
 
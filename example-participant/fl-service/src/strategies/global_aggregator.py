@@ -0,0 +1,85 @@
+import threading
+from typing import Dict, Optional
+
+from flwr.common import Parameters, Weights, bytes_to_ndarray, weights_to_parameters
+
+from .aggregation import WeightedAccumulator
+from ..utils.constants import GLOBAL_STALENESS_EXPONENT
+
+
+class GlobalAggregator:
+    """Cross-shard aggregation of shard models into the global model.
+
+    Synchronous (default): shard aggregates are folded into a running average
+    weighted by each shard's total examples as they are pushed, and published
+    as the next global version on `finalize`.
+
+    Asynchronous (`staleness_alpha` set): each shard aggregate is merged into
+    the global model as soon as it is pushed, with a mixing weight of
+    `staleness_alpha * (staleness + 1) ** -staleness_exponent`, where staleness
+    is how many global versions passed since the shard started training.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Weights] = None,
+        staleness_alpha: Optional[float] = None,
+        staleness_exponent: float = GLOBAL_STALENESS_EXPONENT,
+    ):
+        self.weights = weights
+        self.version = 0
+        self.staleness_alpha = staleness_alpha
+        self.staleness_exponent = staleness_exponent
+        self.shard_examples: Dict[int, int] = {}
+
+        self._accumulator = WeightedAccumulator()
+        self._lock = threading.Lock()
+
+    @property
+    def asynchronous(self) -> bool:
+        return self.staleness_alpha is not None
+
+    @property
+    def parameters(self) -> Optional[Parameters]:
+        weights = self.weights
+        return weights_to_parameters(weights) if weights is not None else None
+
+    def push(
+        self,
+        shard_id: int,
+        parameters: Parameters,
+        num_examples: int,
+        version: Optional[int] = None,
+    ):
+        """Fold in a shard aggregate trained from global `version`."""
+        with self._lock:
+            self.shard_examples[shard_id] = num_examples
+
+            # Nothing to merge into yet, so average the first shards
+            if not self.asynchronous or self.weights is None:
+                self._accumulator.add_parameters(parameters, num_examples)
+                return
+
+            version = self.version if version is None else version
+            staleness = max(self.version - version, 0)
+            alpha = self.staleness_alpha * (staleness + 1) ** -self.staleness_exponent
+            layers = (bytes_to_ndarray(tensor) for tensor in parameters.tensors)
+
+            # Replace (never mutate) layers, so snapshots of the list stay valid
+            weights = list(self.weights)
+            for idx, layer in enumerate(layers):
+                weights[idx] = ((1 - alpha) * weights[idx] + alpha * layer).astype(
+                    weights[idx].dtype, copy=False
+                )
+            self.weights = weights
+            self.version += 1
+
+    def finalize(self) -> Optional[Weights]:
+        """Publish shards pushed since the last call, returning the global weights."""
+        with self._lock:
+            if self._accumulator.num_updates:
+                self.weights = self._accumulator.finalize()
+                self.version += 1
+                self._accumulator = WeightedAccumulator()
+
+            return self.weights
@@ -0,0 +1,75 @@
+import threading
+from contextlib import contextmanager
+
+from .constants import (
+    ENDORSE_MAX_IN_FLIGHT,
+    ENDORSE_QUEUE_SIZE,
+    ENDORSE_QUEUE_TIMEOUT,
+)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class AdmissionQueue:
+    """Admit at most `limit` requests at a time, with a bounded wait for a slot.
+
+    Requests beyond `queue_size` waiters, or not admitted within `timeout`
+    seconds, raise `Overloaded` instead of piling up threads behind the model.
+    """
+
+    def __init__(
+        self,
+        limit: int = ENDORSE_MAX_IN_FLIGHT,
+        queue_size: int = ENDORSE_QUEUE_SIZE,
+        timeout: float = ENDORSE_QUEUE_TIMEOUT,
+    ):
+        self.limit = max(limit, 1)
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self):
+        with self._cond:
+            if self.in_flight >= self.limit:
+                if self.waiting >= self.queue_size:
+                    self.shed += 1
+                    raise Overloaded()
+
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.in_flight < self.limit, self.timeout
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.shed += 1
+                    raise Overloaded()
+
+            self.in_flight += 1
+            self.admitted += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
@@ -6,12 +6,75 @@ DEFAULT_MOMENTUM = 0.9
 
 # FL Process
 DEFAULT_FL_ROUNDS = 5
+AGGREGATION_CHUNK_SIZE = 1024 * 1024
+AGGREGATION_THREADS = 4
+GLOBAL_STALENESS_EXPONENT = 0.5
 
 # Datasets
 SEED = 42
+DATASET_CACHE_DIR = "./dataset/cache"
 CIFAR10_SHARDS = 200
 MNIST_SHARDS = 200
 DEFAULT_TRAIN_SPLIT = 0.7
+DIRICHLET_ALPHA = 0.5
+LABEL_SKEW_CLASSES = 2
+
+# Model Store
+MODEL_STORE_MAX_ENTRIES = 8
+MODEL_STORE_MAX_BYTES = 256 * 1024 * 1024
+MODEL_FETCH_CHUNK_SIZE = 1024 * 1024
+
+# Fabric SDK
+FABRIC_CLIENT_POOL_SIZE = 16
+
+# Endorsement
+ENDORSE_FETCH_WORKERS = 8
+# Model fetch connect and read timeouts (seconds), the read timeout is between bytes
+ENDORSE_FETCH_TIMEOUT = (5, 30)
+ENDORSE_MAX_BATCH = 8
+ENDORSE_VERDICT_CACHE_SIZE = 1024
+ENDORSE_VERDICT_CACHE_TTL = 300
+# Sequential testing: evaluate growing stratified subsamples until a Hoeffding bound
+# at ENDORSE_CONFIDENCE decides, higher confidence means fewer false rejects but
+# more samples. Off by default: verdicts can then differ from a full pass for
+# models close to the threshold
+ENDORSE_SEQUENTIAL = False
+ENDORSE_MIN_SAMPLES = 64
+ENDORSE_SAMPLE_GROWTH = 2
+ENDORSE_CONFIDENCE = 0.99
+# Admission: requests endorsed at once, requests waiting for a slot (up to the
+# timeout, seconds), the rest are shed with 503 and Retry-After
+ENDORSE_MAX_IN_FLIGHT = 8
+ENDORSE_QUEUE_SIZE = 4
+ENDORSE_QUEUE_TIMEOUT = 2.0
+ENDORSE_RETRY_AFTER = 1
+
+# Serving, request threads of the production (waitress) server. Admitted and
+# waiting endorsements can hold at most MAX_IN_FLIGHT + QUEUE_SIZE threads, the
+# spare ones keep /model and /health answering for peers. Open connections and
+# the listen backlog are bounded, so excess load is refused rather than queued
+SERVE_SPARE_THREADS = 8
+SERVE_THREADS = ENDORSE_MAX_IN_FLIGHT + ENDORSE_QUEUE_SIZE + SERVE_SPARE_THREADS
+SERVE_CONNECTION_LIMIT = 64
+SERVE_BACKLOG = 64
+
+# Training jobs
+JOB_HISTORY_SIZE = 32
+JOB_POLL_INTERVAL = 1.0
+
+# Orchestration, readiness probes
+READY_TIMEOUT = 120
+READY_POLL_INTERVAL = 0.1
+
+# Process supervision, restart backoff (seconds) and worker output
+SUPERVISOR_POLL_INTERVAL = 0.5
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 60.0
+WORKER_LOG_DIR = "logs"
+
+# Profiling, span histogram bucket upper bounds (seconds) and trace events kept
+PROFILE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+PROFILE_MAX_EVENTS = 100000
 
 # Opacus
 PRIVACY_TARGET_DELTA = 1e-5
@@ -1,13 +1,348 @@
+import copy
+import math
+import queue
+import threading
+from logging import INFO, log
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import requests
 from flwr.client.numpy_client import NumPyClientWrapper
-from flwr.common import Parameters
-from flwr.common.typing import EvaluateIns
+from flwr.common import Weights, parameters_to_weights
+from torch.utils.data import DataLoader, TensorDataset
+
+from .cache import TTLCache
+from .profiling import profiler
+from .constants import (
+    DEFAULT_BATCH_SIZE,
+    ENDORSE_CONFIDENCE,
+    ENDORSE_FETCH_TIMEOUT,
+    ENDORSE_FETCH_WORKERS,
+    ENDORSE_MAX_BATCH,
+    ENDORSE_MIN_SAMPLES,
+    ENDORSE_SAMPLE_GROWTH,
+    ENDORSE_SEQUENTIAL,
+    ENDORSE_VERDICT_CACHE_SIZE,
+    ENDORSE_VERDICT_CACHE_TTL,
+    MODEL_FETCH_CHUNK_SIZE,
+    SEED,
+)
+from ..datasets.cache import tensor_loader
+from ..models.evaluation.train_cls import test_many
+from ..models.utils import deserialize_model, hash_model
+
+
+def fetch_model(server: str, model_hash: str) -> Tuple[str, bytes]:
+    """Stream a serialized model from its owner, returning the claimed hash and bytes."""
+    with requests.get(
+        f"{server}/model/{model_hash}", stream=True, timeout=ENDORSE_FETCH_TIMEOUT
+    ) as res:
+        res.raise_for_status()
+        chunks = list(res.iter_content(chunk_size=MODEL_FETCH_CHUNK_SIZE))
+
+    return res.headers["X-Model-Hash"], b"".join(chunks)
+
+
+def stratified_order(labels: np.ndarray, seed: int = SEED) -> np.ndarray:
+    """Order samples so that every prefix keeps the class proportions of the set."""
+    rs = np.random.RandomState(seed)
+    _, class_ids, counts = np.unique(
+        np.asarray(labels), return_inverse=True, return_counts=True
+    )
+
+    # Spread each class evenly over [0, 1), in a random order within the class
+    order = np.lexsort((rs.random_sample(len(class_ids)), class_ids))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    class_rank = np.arange(len(order)) - starts[class_ids[order]]
+    position = np.empty(len(order))
+    position[order] = (class_rank + rs.random_sample(len(order))) / counts[
+        class_ids[order]
+    ]
+
+    return np.argsort(position, kind="stable")
+
+
+def sequential_test(
+    net,
+    candidates: List[Weights],
+    images: np.ndarray,
+    labels: np.ndarray,
+    min_accuracy: float,
+    min_samples: int = ENDORSE_MIN_SAMPLES,
+    growth: float = ENDORSE_SAMPLE_GROWTH,
+    confidence: float = ENDORSE_CONFIDENCE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[Tuple[bool, float, int]]:
+    """Decide whether each candidate's accuracy is above `min_accuracy`, using as
+    few samples as possible.
+
+    Candidates are scored on growing prefixes of (`images`, `labels`), which
+    should be in stratified order, only on the samples new to each prefix. A
+    candidate is decided once its accuracy's Hoeffding bound clears
+    `min_accuracy` either way. With a union bound over the prefixes, a decision
+    is wrong with probability at most `1 - confidence`. Undecided candidates are
+    judged on the full set.
+
+    Returns (passed, accuracy, samples used) per candidate.
+    """
+    total = len(labels)
+    prefixes = [min(max(min_samples, 1), total)]
+    while prefixes[-1] < total:
+        prefixes.append(min(max(int(prefixes[-1] * growth), prefixes[-1] + 1), total))
+    log_term = math.log(2 * len(prefixes) / (1 - confidence))
+
+    results: List[Tuple[bool, float, int]] = [None] * len(candidates)
+    correct = [0] * len(candidates)
+    undecided = list(range(len(candidates)))
+    start = 0
+    for end in prefixes:
+        loader = tensor_loader(images[start:end], labels[start:end], batch_size)
+        scores = test_many(net, [candidates[idx] for idx in undecided], loader)
+        for idx, (_, accuracy) in zip(undecided, scores):
+            correct[idx] += round(accuracy * (end - start))
+
+        radius = math.sqrt(log_term / (2 * end))
+        remaining = []
+        for idx in undecided:
+            accuracy = correct[idx] / end
+            if end == total:
+                results[idx] = (accuracy > min_accuracy, accuracy, end)
+            elif accuracy - radius > min_accuracy:
+                results[idx] = (True, accuracy, end)
+            elif accuracy + radius <= min_accuracy:
+                results[idx] = (False, accuracy, end)
+            else:
+                remaining.append(idx)
+
+        undecided, start = remaining, end
+        if not undecided:
+            break
+
+    return results
+
+
+class EndorsementPipeline:
+    """Endorse models concurrently: fetch in a thread pool, dedup by hash, and
+    score every pending candidate in a single batched pass over the local test set.
+
+    Candidates are evaluated on a scratch copy of the client model, so the
+    client's training lock is never held. Verdicts are cached per
+    (model hash, local model hash, accuracy threshold).
+
+    With `sequential` set (opt-in, see ENDORSE_SEQUENTIAL), candidates are judged
+    by `sequential_test` on a stratified order of the test set, stopping as soon
+    as they are decided. Otherwise every candidate is scored on the full test set.
+    """
+
+    def __init__(
+        self,
+        client: NumPyClientWrapper,
+        accuracy_threshold=5,
+        fetch_workers: int = ENDORSE_FETCH_WORKERS,
+        max_batch: int = ENDORSE_MAX_BATCH,
+        verdict_cache_size: int = ENDORSE_VERDICT_CACHE_SIZE,
+        verdict_cache_ttl: float = ENDORSE_VERDICT_CACHE_TTL,
+        sequential: bool = ENDORSE_SEQUENTIAL,
+        min_samples: int = ENDORSE_MIN_SAMPLES,
+        sample_growth: float = ENDORSE_SAMPLE_GROWTH,
+        confidence: float = ENDORSE_CONFIDENCE,
+    ):
+        self.client = client
+        self.accuracy_threshold = accuracy_threshold
+        self.max_batch = max(max_batch, 1)
+        self.sequential = sequential
+        self.min_samples = min_samples
+        self.sample_growth = sample_growth
+        self.confidence = confidence
+
+        # Evaluated models, samples they used, and how many stopped early
+        self.models_evaluated = 0
+        self.samples_evaluated = 0
+        self.early_stops = 0
+        self._testset: Tuple[np.ndarray, np.ndarray] = None
+
+        self.verdicts = TTLCache(verdict_cache_size, verdict_cache_ttl)
+
+        self._net = copy.deepcopy(client.numpy_client.model)
+        self._layout = [
+            (tuple(value.shape), value.detach().cpu().numpy().dtype)
+            for value in self._net.state_dict().values()
+        ]
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._fetch_pool = ThreadPoolExecutor(
+            fetch_workers, thread_name_prefix="endorse-fetch"
+        )
+
+        threading.Thread(
+            target=self._evaluate_loop, name="endorse-eval", daemon=True
+        ).start()
+
+    def endorse(self, models: Iterable[Tuple[str, str]]) -> bool:
+        """Endorse (server, model_hash) pairs, True only if every model passes."""
+        unique_models = {model_hash: server for server, model_hash in models}
+        futures = [
+            self.submit(server, model_hash)
+            for model_hash, server in unique_models.items()
+        ]
+
+        return all(self._passed(future) for future in futures)
+
+    def _passed(self, future: Future) -> bool:
+        try:
+            return future.result()
+        except requests.RequestException:
+            # the owner could not serve the model now, e.g. warming up or evicted,
+            # it fails this endorsement but is fetched again next time
+            return False
+
+    def submit(self, server: str, model_hash: str) -> Future:
+        key = (
+            model_hash,
+            self.client.numpy_client.committed_info.model_hash,
+            self.accuracy_threshold,
+        )
+        verdict = self.verdicts.get(key)
+        if verdict is not None:
+            future = Future()
+            future.set_result(verdict)
+            return future
+
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future:
+                return future
+            future = self._inflight[key] = Future()
+
+        future.add_done_callback(lambda _: self._release(key, future))
+        self._fetch_pool.submit(self._fetch, server, model_hash, future)
+
+        return future
+
+    def _release(self, key: tuple, future: Future):
+        # Only verdicts are cached, failures to fetch or evaluate are retried
+        if not future.exception():
+            self.verdicts.put(key, future.result())
+
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def _fetch(self, server: str, model_hash: str, future: Future):
+        try:
+            with profiler.span("endorse.fetch"):
+                claimed_hash, serialized_model = fetch_model(server, model_hash)
+
+            # check the owner serves the model on the ledger, and the bytes match it
+            with profiler.span("endorse.verify"):
+                if model_hash != claimed_hash or model_hash != hash_model(
+                    serialized_model
+                ):
+                    future.set_result(False)
+                    return
+
+                parameters = deserialize_model(serialized_model).parameters
+                weights = parameters_to_weights(parameters)
+
+                # a model that does not fit the local architecture cannot pass
+                if not self.fits(weights):
+                    future.set_result(False)
+                    return
+            self._pending.put((weights, future))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _evaluate_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._judge_batch(batch)
+
+    def _judge_batch(self, batch: List[Tuple[Weights, Future]]):
+        try:
+            with profiler.span("endorse.evaluate", models=len(batch)):
+                verdicts = self.judge([weights for weights, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+
+            # judge candidates one at a time, so a bad one only fails itself
+            for item in batch:
+                self._judge_batch([item])
+            return
+
+        for (_, future), verdict in zip(batch, verdicts):
+            future.set_result(verdict)
+
+    def fits(self, weights: Weights) -> bool:
+        """Whether weights match the local model's layer count, shapes and dtypes."""
+        return len(weights) == len(self._layout) and all(
+            layer.shape == shape and layer.dtype == dtype
+            for layer, (shape, dtype) in zip(weights, self._layout)
+        )
+
+    def judge(self, candidates: List[Weights]) -> List[bool]:
+        local_accuracy = self.client.numpy_client.committed_info.highest_acc
+        min_accuracy = local_accuracy - self.accuracy_threshold
+        if not self.sequential:
+            return [accuracy > min_accuracy for accuracy in self.evaluate(candidates)]
+
+        images, labels = self.testset()
+        results = sequential_test(
+            self._net,
+            candidates,
+            images,
+            labels,
+            min_accuracy,
+            min_samples=self.min_samples,
+            growth=self.sample_growth,
+            confidence=self.confidence,
+        )
+
+        for passed, accuracy, samples in results:
+            log(
+                INFO,
+                f"endorsement: passed={passed} accuracy={accuracy:.4f} "
+                f"samples={samples}/{len(labels)}",
+            )
+            self.models_evaluated += 1
+            self.samples_evaluated += samples
+            self.early_stops += samples < len(labels)
+
+        return [passed for passed, _, _ in results]
+
+    def testset(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The local test set as arrays, in stratified order."""
+        if self._testset is None:
+            dataset = self.client.numpy_client.testloader.dataset
+            if isinstance(dataset, TensorDataset):
+                images, labels = (tensor.numpy() for tensor in dataset.tensors)
+            else:
+                batches = list(DataLoader(dataset, batch_size=DEFAULT_BATCH_SIZE))
+                images = np.concatenate([images.numpy() for images, _ in batches])
+                labels = np.concatenate([labels.numpy() for _, labels in batches])
+
+            order = stratified_order(labels)
+            self._testset = (images[order], labels[order])
 
+        return self._testset
 
-def endorse_model(
-    client: NumPyClientWrapper, parameters: Parameters, accuracy_threshold=5
-) -> bool:
-    eval_res = client.evaluate(EvaluateIns(parameters=parameters, config={}))
-    suspicious_accuracy = eval_res.metrics["accuracy"] or eval_res.accuracy
-    local_accuracy = client.numpy_client.checkpoint_info.highest_acc
+    def stats(self) -> dict:
+        return {
+            "verdict_cache": self.verdicts.stats(),
+            "sequential": self.sequential,
+            "models_evaluated": self.models_evaluated,
+            "samples_evaluated": self.samples_evaluated,
+            "early_stops": self.early_stops,
+        }
 
-    return suspicious_accuracy > local_accuracy - accuracy_threshold
+    def evaluate(self, candidates: List[Weights]) -> List[float]:
+        results = test_many(self._net, candidates, self.client.numpy_client.testloader)
+        return [accuracy for _, accuracy in results]
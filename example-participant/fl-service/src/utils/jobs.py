@@ -0,0 +1,87 @@
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .constants import JOB_HISTORY_SIZE
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    job_id: str
+    name: str = ""
+    status: str = JOB_QUEUED
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def report(self, progress: Dict[str, Any]):
+        # Replaced rather than updated, so readers never see a dict mid-change
+        self.progress = {**self.progress, **progress}
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobRunner:
+    """Run jobs one at a time on a background thread.
+
+    The last `history` jobs are kept for status queries.
+    """
+
+    def __init__(self, history: int = JOB_HISTORY_SIZE):
+        self.history = max(history, 1)
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+        threading.Thread(target=self._run, name="jobs", daemon=True).start()
+
+    def submit(self, fn: Callable[[Job], Any], name: str = "") -> Job:
+        """Queue `fn(job)`, its return value becomes the job's result."""
+        job = Job(job_id=uuid.uuid4().hex, name=name)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs.values()))
+                if not oldest.done:
+                    break
+                self._jobs.popitem(last=False)
+
+        self._queue.put((job, fn))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _run(self):
+        while True:
+            job, fn = self._queue.get()
+            job.status, job.started = JOB_RUNNING, time.time()
+            try:
+                job.result = fn(job)
+                job.status = JOB_SUCCEEDED
+            except Exception as e:
+                job.error = repr(e)
+                job.status = JOB_FAILED
+            job.finished = time.time()
@@ -0,0 +1,133 @@
+import os
+import json
+import atexit
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import Dict
+
+from .constants import PROFILE_BUCKETS, PROFILE_MAX_EVENTS
+
+_DISABLED_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: "Profiler", name: str, args: dict):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        self.profiler.record(
+            self.name, self.start, time.perf_counter_ns() - self.start, self.args
+        )
+
+
+class Profiler:
+    """Timing spans for each phase of a round.
+
+    Every span updates a histogram for its name, and is kept as a trace event
+    (the last `max_events`) that can be exported in the Chrome trace format.
+    When disabled, `span` returns a shared no-op context manager.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        buckets=PROFILE_BUCKETS,
+        max_events: int = PROFILE_MAX_EVENTS,
+    ):
+        self.enabled = enabled
+        self.buckets = sorted(buckets)
+
+        self._histograms: Dict[str, dict] = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **args):
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return _Span(self, name, args)
+
+    def record(self, name: str, start_ns: int, duration_ns: int, args: dict = {}):
+        duration = duration_ns / 1e9
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if not histogram:
+                histogram = self._histograms[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": duration,
+                    "max": duration,
+                    "buckets": [0] * (len(self.buckets) + 1),
+                }
+            histogram["count"] += 1
+            histogram["total"] += duration
+            histogram["min"] = min(histogram["min"], duration)
+            histogram["max"] = max(histogram["max"], duration)
+            histogram["buckets"][bisect.bisect_left(self.buckets, duration)] += 1
+
+            self._events.append(
+                (name, start_ns, duration_ns, threading.get_ident(), args)
+            )
+
+    def metrics(self) -> dict:
+        """Per span name: count, total, mean, min and max seconds, and a histogram
+        of counts per upper bound in seconds (the last bucket is unbounded)."""
+        with self._lock:
+            return {
+                name: {
+                    **{k: v for k, v in histogram.items() if k != "buckets"},
+                    "mean": histogram["total"] / histogram["count"],
+                    "buckets": dict(
+                        zip([*map(str, self.buckets), "inf"], histogram["buckets"])
+                    ),
+                }
+                for name, histogram in self._histograms.items()
+            }
+
+    def trace(self) -> dict:
+        """Recorded spans as a Chrome trace (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+
+        return {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start_ns / 1e3,
+                    "dur": duration_ns / 1e3,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+                for name, start_ns, duration_ns, tid, args in events
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_trace(self, file: str):
+        with open(file, "w") as f:
+            json.dump(self.trace(), f)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._events.clear()
+
+
+# Process wide profiler, enabled with PROFILE=True, PROFILE_TRACE=<file> also
+# writes the trace on exit
+profiler = Profiler(enabled=os.environ.get("PROFILE", "False") == "True")
+if profiler.enabled and os.environ.get("PROFILE_TRACE"):
+    atexit.register(profiler.export_trace, os.environ["PROFILE_TRACE"])
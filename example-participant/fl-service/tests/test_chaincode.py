@@ -0,0 +1,61 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.fabric.chaincode import ChaincodeClient
+
+DELAY = 0.2
+N_QUERIES = 8
+
+
+class SlowQueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(DELAY)
+
+        body = json.dumps(req["args"][0] != "missing").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def client():
+    server = ThreadingHTTPServer(("localhost", 0), SlowQueryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield ChaincodeClient(port=server.server_address[1], pool_size=N_QUERIES)
+
+    server.shutdown()
+
+
+def model_ids():
+    return [[f"model-{i}"] for i in range(N_QUERIES - 1)] + [["missing"]]
+
+
+def test_query_many_runs_concurrently(client):
+    start = time.perf_counter()
+    res = client.query_many("channel", "contract", "ModelExists", model_ids())
+
+    assert res == ["true"] * (N_QUERIES - 1) + ["false"]
+    assert time.perf_counter() - start < DELAY * N_QUERIES / 2
+
+
+def test_query_many_async_runs_concurrently(client):
+    start = time.perf_counter()
+    res = asyncio.run(
+        client.query_many_async("channel", "contract", "ModelExists", model_ids())
+    )
+
+    assert res == ["true"] * (N_QUERIES - 1) + ["false"]
+    assert time.perf_counter() - start < DELAY * N_QUERIES / 2
@@ -7,6 +7,8 @@ import (
 	"fmt"
 	"net/http"
 	"os"
+	"strconv"
+	"time"
 
 	"github.com/golang/protobuf/proto"
 	"github.com/hyperledger/fabric-protos-go/peer"
@@ -17,6 +19,9 @@ import (
 
 var FLASK_SERVER = os.Getenv("FLASK_SERVER")
 
+// Overloaded participants answer 503 with Retry-After, evaluation is retried this many times
+const MAX_EVALUATE_RETRIES = 3
+
 // To build the plugin,
 // run:
 //    go build -buildmode=plugin -o escc.so plugin.go
@@ -70,17 +75,42 @@ func (e *ModelEndorsement) Endorse(prpBytes []byte, sp *peer.SignedProposal) (*p
 
 	txRWSetJSON, err := json.Marshal(txRWSet)
 
-	resp, err := http.Post(FLASK_SERVER, "application/json", bytes.NewBuffer(txRWSetJSON))
-	if err != nil {
-		return nil, nil, fmt.Errorf("Could not evaluate model: %v", err)
-	}
-	if resp.StatusCode != 200 {
-		return nil, nil, fmt.Errorf("Could not evaluate model: %v", err)
+	if err := evaluateModel(txRWSetJSON); err != nil {
+		return nil, nil, err
 	}
 
 	return endorsement, prpBytes, nil
 }
 
+// evaluateModel posts the read/write set to the participant, retrying while it is overloaded
+func evaluateModel(txRWSetJSON []byte) error {
+	for attempt := 0; ; attempt++ {
+		resp, err := http.Post(FLASK_SERVER, "application/json", bytes.NewBuffer(txRWSetJSON))
+		if err != nil {
+			return fmt.Errorf("Could not evaluate model: %v", err)
+		}
+		resp.Body.Close()
+
+		if resp.StatusCode == http.StatusServiceUnavailable && attempt < MAX_EVALUATE_RETRIES {
+			time.Sleep(retryAfter(resp))
+			continue
+		}
+		if resp.StatusCode != http.StatusOK {
+			return fmt.Errorf("Could not evaluate model: status %d", resp.StatusCode)
+		}
+		return nil
+	}
+}
+
+// retryAfter reads the Retry-After seconds of a response, one second if it is missing
+func retryAfter(resp *http.Response) time.Duration {
+	seconds, err := strconv.Atoi(resp.Header.Get("Retry-After"))
+	if err != nil || seconds < 0 {
+		seconds = 1
+	}
+	return time.Duration(seconds) * time.Second
+}
+
 // Init injects dependencies into the instance of the Plugin
 func (e *ModelEndorsement) Init(dependencies ...endorsement.Dependency) error {
 	for _, dep := range dependencies {